@@ -0,0 +1,146 @@
+"""Contrôle d'admission par classe de coût.
+
+Chaque route tarifée est rattachée à une classe selon le nombre de crédits
+de sa fonctionnalité (voir ``/pricing``). Une classe limite le nombre de
+requêtes en cours et la taille de sa file d'attente ; une requête qui ne
+trouve pas de place, ou qui attend plus que le délai de sa classe, est
+rejetée tout de suite en 503 avec Retry-After plutôt que d'encombrer la
+boucle. Les routes gratuites gardent ainsi une latence bornée même quand
+les exports et optimisations saturent leur propre classe.
+
+Middleware ASGI pur : les réponses en streaming (SSE) ne sont pas
+bufferisées et les routes non tarifées ne sont pas concernées.
+"""
+import asyncio
+import json
+import math
+import time
+from typing import Dict, Optional
+
+
+class CostClass:
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    async def acquire(self) -> Optional[str]:
+        """None si la requête est admise, sinon la raison du rejet."""
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            self._admit(0.0)
+            return None
+
+        if self.waiting >= self.max_queue:
+            self.rejected_queue_full += 1
+            return "queue_full"
+
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            return "queue_timeout"
+        finally:
+            self.waiting -= 1
+        self._admit(time.perf_counter() - start)
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def _admit(self, wait: float):
+        self.in_flight += 1
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 3) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class AdmissionController:
+    """Associe chaque route tarifée à sa classe de coût."""
+
+    def __init__(self, route_credits: Dict[str, int], class_limits: Dict[int, dict]):
+        self.classes = {
+            credits: CostClass(f"credits_{credits}", **limits) for credits, limits in class_limits.items()
+        }
+        self.routes: Dict[str, CostClass] = {}
+        for path, credits in route_credits.items():
+            # Classe la plus proche par valeur inférieure si le niveau n'a pas de limites propres
+            level = max((c for c in self.classes if c <= credits), default=min(self.classes))
+            self.routes[path] = self.classes[level]
+        self.enabled = True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "classes": {cost_class.name: cost_class.stats() for cost_class in self.classes.values()},
+        }
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.controller.enabled:
+            return await self.app(scope, receive, send)
+
+        cost_class = self.controller.routes.get(scope["path"])
+        if cost_class is None:
+            return await self.app(scope, receive, send)
+
+        rejection = await cost_class.acquire()
+        if rejection is not None:
+            return await self._reject(send, cost_class, rejection)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            cost_class.release()
+
+    async def _reject(self, send, cost_class: CostClass, reason: str):
+        body = json.dumps({
+            "detail": "Serveur saturé pour ce type de calcul, réessayez plus tard",
+            "reason": reason,
+            "cost_class": cost_class.name,
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(cost_class.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
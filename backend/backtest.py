@@ -0,0 +1,184 @@
+"""Backtest historique des prêts à taux variable capé.
+
+La série mensuelle du taux de référence 3 mois (``reference_rates.csv``,
+valeurs approximatives) est convertie une fois en ``.npy`` puis ouverte en
+mémoire partagée. Un prêt est rejoué depuis chaque mois de départ possible :
+taux initial = indice + marge, révisé à chaque échéance de révision après
+la période fixe, borné par les caps autour du taux initial, mensualité
+recalculée sur la durée restante. La boucle ne porte que sur les périodes
+de révision ; chaque pas est vectorisé sur toutes les dates de départ.
+"""
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+from loan_math import annuity_factor
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+SERIES_CSV = os.path.join(_DIR, "reference_rates.csv")
+SERIES_PATH = os.environ.get("REFERENCE_RATES_PATH", os.path.join(_DIR, "reference_rates.npy"))
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+_SERIES_DTYPE = np.dtype([("mois", "i4"), ("taux", "f8")])  # mois = année * 12 + (mois - 1)
+
+_series = None
+_series_lock = threading.Lock()
+
+
+def _build_series(csv_path: str, path: str) -> None:
+    mois, taux = [], []
+    with open(csv_path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#") or line.startswith("date") or not line.strip():
+                continue
+            date, value = line.strip().split(",")
+            year, month = date.split("-")
+            mois.append(int(year) * 12 + int(month) - 1)
+            taux.append(float(value))
+    data = np.empty(len(mois), dtype=_SERIES_DTYPE)
+    data["mois"], data["taux"] = mois, taux
+    if np.any(np.diff(data["mois"]) != 1):
+        raise ValueError(f"{csv_path}: la série doit être mensuelle et continue")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, data)
+    os.replace(tmp_path, path)
+
+
+def get_series() -> np.ndarray:
+    """Série de référence (tableau structuré ``mois``/``taux``), reconstruite si le CSV a changé."""
+    global _series
+    if _series is None:
+        with _series_lock:
+            if _series is None:
+                if not os.path.exists(SERIES_PATH) or os.path.getmtime(SERIES_PATH) < os.path.getmtime(SERIES_CSV):
+                    _build_series(SERIES_CSV, SERIES_PATH)
+                _series = np.load(SERIES_PATH, mmap_mode="r")
+    return _series
+
+
+def _format_month(mois: int) -> str:
+    return f"{mois // 12}-{mois % 12 + 1:02d}"
+
+
+def backtest_variable_loan(montant: float, duree: int, marge: float, taux_fixe: Optional[float] = None,
+                           prime_fixe: float = 0.5, cap_hausse: float = 1.0, cap_baisse: float = 1.0,
+                           periode_fixe: int = 0, revision: int = 12, complet_uniquement: bool = True,
+                           series: Optional[np.ndarray] = None) -> dict:
+    """Rejoue le prêt depuis chaque mois de départ ; taux et marges en %.
+
+    Le prêt fixe de comparaison est au taux ``taux_fixe`` pour tous les départs
+    si fourni, sinon au taux variable initial du même départ + ``prime_fixe``.
+    """
+    series = get_series() if series is None else series
+    indice = np.asarray(series["taux"], dtype=np.float64)
+    n_mois = len(indice)
+
+    n_departs = n_mois - duree + 1 if complet_uniquement else n_mois
+    if n_departs <= 0:
+        raise ValueError(f"Historique trop court pour un prêt de {duree} mois")
+    departs = np.arange(n_departs)
+
+    # Débuts des périodes à taux constant : départ, puis chaque révision après la période fixe
+    revisions = np.arange(periode_fixe if periode_fixe > 0 else revision, duree, revision)
+    bornes = np.concatenate([[0], revisions, [duree]])
+    debuts, longueurs = bornes[:-1], np.diff(bornes).astype(np.float64)
+
+    taux_initial = indice[departs] + marge
+    observe = np.minimum(departs[:, None] + debuts[None, :], n_mois - 1)  # au-delà : dernier taux connu
+    taux = np.clip(indice[observe] + marge, (taux_initial - cap_baisse)[:, None], (taux_initial + cap_hausse)[:, None])
+    taux[:, 0] = taux_initial
+    taux = np.maximum(taux, 0.0)
+
+    capital = np.full(n_departs, float(montant))
+    mensualites = np.empty_like(taux)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, (debut, longueur) in enumerate(zip(debuts.tolist(), longueurs.tolist())):
+            r = taux[:, p] / 100 / 12
+            mensualites[:, p] = capital * annuity_factor(r, duree - debut)
+            croissance = np.exp(longueur * np.log1p(r))
+            capital = np.where(
+                r > 0,
+                capital * croissance - mensualites[:, p] * (croissance - 1) / np.where(r > 0, r, 1),
+                capital - mensualites[:, p] * longueur,
+            )
+
+    cout_credit = mensualites @ longueurs - montant
+    taux_fixe = np.full(n_departs, taux_fixe) if taux_fixe is not None else taux_initial + prime_fixe
+    mensualite_fixe = montant * annuity_factor(np.maximum(taux_fixe, 0.0) / 100 / 12, duree)
+    cout_fixe = mensualite_fixe * duree - montant
+    ecart = cout_credit - cout_fixe
+
+    # Trajectoire des mensualités au début de chaque année du prêt
+    annees = np.arange(0, duree, 12)
+    trajectoires = mensualites[:, np.searchsorted(debuts, annees, side="right") - 1]
+
+    return {
+        "premier_mois": int(series["mois"][0]),
+        "departs": departs,
+        "historique_complet": departs + duree <= n_mois,
+        "taux_initial": taux_initial,
+        "taux_max": taux.max(axis=1),
+        "mensualite_initiale": mensualites[:, 0],
+        "mensualite_max": mensualites.max(axis=1),
+        "cout_credit": cout_credit,
+        "ecart_fixe": ecart,
+        "trajectoires": trajectoires,
+        "taux_fixe": taux_fixe,
+        "mensualite_fixe": mensualite_fixe,
+        "cout_fixe": cout_fixe,
+    }
+
+
+def summarize_backtest(result: dict, details: bool = False) -> dict:
+    def quantiles(values, decimals=2):
+        return {f"p{q}": round(float(v), decimals) for q, v in zip(PERCENTILES, np.percentile(values, PERCENTILES, axis=0))}
+
+    cout = result["cout_credit"]
+    ecart = result["ecart_fixe"]
+    premier_mois = result["premier_mois"]
+    meilleur, pire = int(np.argmin(cout)), int(np.argmax(cout))
+    fan = np.percentile(result["trajectoires"], PERCENTILES, axis=0)
+
+    summary = {
+        "nombre_departs": len(cout),
+        "periode": [_format_month(premier_mois), _format_month(premier_mois + int(result["departs"][-1]))],
+        "fixe": {
+            "taux": quantiles(result["taux_fixe"], 3),
+            "mensualite": quantiles(result["mensualite_fixe"]),
+            "cout_credit": quantiles(result["cout_fixe"]),
+        },
+        "cout_credit": quantiles(cout),
+        "ecart_vs_fixe": quantiles(ecart),
+        "part_moins_cher_que_fixe": round(float(np.mean(ecart < 0)) * 100, 1),
+        "mensualite_max": quantiles(result["mensualite_max"]),
+        "trajectoire_mensualites": [
+            {"annee": annee + 1, **{f"p{q}": round(float(v), 2) for q, v in zip(PERCENTILES, fan[:, annee])}}
+            for annee in range(fan.shape[1])
+        ],
+        "meilleur_depart": {"date": _format_month(premier_mois + meilleur), "cout_credit": round(float(cout[meilleur]), 2)},
+        "pire_depart": {"date": _format_month(premier_mois + pire), "cout_credit": round(float(cout[pire]), 2)},
+    }
+    if details:
+        summary["departs"] = [
+            {
+                "date": _format_month(premier_mois + depart),
+                "taux_initial": round(t0, 3),
+                "taux_max": round(tmax, 3),
+                "mensualite_initiale": round(m0, 2),
+                "mensualite_max": round(mmax, 2),
+                "cout_credit": round(c, 2),
+                "ecart_vs_fixe": round(e, 2),
+                "historique_complet": complet,
+            }
+            for depart, t0, tmax, m0, mmax, c, e, complet in zip(
+                result["departs"].tolist(), result["taux_initial"].tolist(), result["taux_max"].tolist(),
+                result["mensualite_initiale"].tolist(), result["mensualite_max"].tolist(),
+                cout.tolist(), ecart.tolist(), result["historique_complet"].tolist(),
+            )
+        ]
+    return summary
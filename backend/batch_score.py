@@ -0,0 +1,437 @@
+"""Scoring hors ligne de dossiers en masse (capacité d'emprunt, comparaison d'offres).
+
+Mêmes formules que ``/calculate`` et ``/calculate/multi-offer`` (loan_math,
+taeg), sans passer par l'API. Le fichier d'entrée est lu par blocs de
+``--chunk-size`` enregistrements ; chaque bloc est décodé et calculé de façon
+vectorisée dans un pool de processus, puis écrit dans l'ordre dès qu'il est
+prêt. Le nombre de blocs en vol est borné : la mémoire reste constante quelle
+que soit la taille du fichier. La progression (lignes, lignes/s) s'affiche
+sur stderr.
+
+Usage :
+    python batch_score.py capacity dossiers.csv scores.csv
+    python batch_score.py offers dossiers.csv comparaisons.csv --offers offres.csv
+    python batch_score.py capacity dossiers.parquet scores.parquet  # nécessite pyarrow
+
+``-`` désigne stdin/stdout (CSV uniquement).
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from loan_math import annuity_factor
+from taeg import compute_taeg, insurance_monthly
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # format colonnaire optionnel
+    pa = pq = None
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Colonnes d'entrée et valeurs par défaut (None = obligatoire), comme les modèles de requête de l'API
+CAPACITY_COLUMNS = {
+    "salaire": None,
+    "autres_revenus": 0.0,
+    "charges": 0.0,
+    "taux": 3.5,
+    "duree": 240.0,
+    "taux_effort_max": 0.33,
+}
+OFFERS_COLUMNS = {
+    "prix_bien": None,
+    "apport": 0.0,
+}
+OFFER_FIELDS = {
+    "taux": None,
+    "duree": None,
+    "frais_dossier": 0.0,
+    "assurance_mensuelle": 0.0,
+    "taux_assurance": 0.0,
+}
+
+CAPACITY_OUTPUT = ("montant", "mensualite_max", "cout_total", "cout_credit", "revenu_total", "error")
+INVALID_ROW_ERROR = "Ligne invalide"
+OUTPUT_DECIMALS = {"taeg": 3, "meilleur_taeg": 3}
+OFFERS_OUTPUT = (
+    "montant_emprunte", "meilleure_offre", "mensualite_totale", "cout_total", "cout_credit", "taeg",
+    "meilleur_taeg_offre", "meilleur_taeg", "economie", "error",
+)
+
+
+def score_capacity(cols: dict) -> dict:
+    """Capacité d'emprunt, comme ``calculate``."""
+    revenu_total = cols["salaire"] + cols["autres_revenus"]
+    mensualite_max = revenu_total * cols["taux_effort_max"] - cols["charges"]
+    insuffisant = mensualite_max <= 0
+
+    montant = mensualite_max / annuity_factor(cols["taux"] / 100 / 12, cols["duree"])
+    cout_total = mensualite_max * cols["duree"]
+    zero = np.zeros_like(montant)
+    return {
+        "montant": np.where(insuffisant, zero, montant),
+        "mensualite_max": np.where(insuffisant, zero, mensualite_max),
+        "cout_total": np.where(insuffisant, zero, cout_total),
+        "cout_credit": np.where(insuffisant, zero, cout_total - montant),
+        "revenu_total": revenu_total,
+        "error": np.where(insuffisant, "Capacité d'emprunt insuffisante", ""),
+    }
+
+
+def score_offers(cols: dict, offers: dict) -> dict:
+    """Meilleure offre et meilleur TAEG de chaque dossier, comme ``compare_offers``."""
+    montant = (cols["prix_bien"] - cols["apport"])[:, None]  # dossiers x offres
+    taux, duree, frais = offers["taux"][None, :], offers["duree"][None, :], offers["frais_dossier"][None, :]
+
+    mensualite_credit = montant * annuity_factor(taux / 100 / 12, duree)
+    assurance = insurance_monthly(montant, offers["taux_assurance"][None, :], offers["assurance_mensuelle"][None, :])
+    mensualite_totale = mensualite_credit + assurance
+    cout_total = mensualite_totale * duree + frais
+
+    taeg = compute_taeg(
+        montant, taux, duree, frais_dossier=frais,
+        assurance_mensuelle=offers["assurance_mensuelle"][None, :],
+        taux_assurance=offers["taux_assurance"][None, :],
+    )["taeg"]
+
+    rows = np.arange(len(montant))
+    best = np.argmin(cout_total, axis=1)
+    has_taeg = np.isfinite(taeg).any(axis=1)
+    best_taeg = np.argmin(np.where(np.isfinite(taeg), taeg, np.inf), axis=1)
+    names = offers["bank_name"]
+    # Économie calculée sur les coûts arrondis au centime, comme l'endpoint
+    couts_arrondis = np.round(cout_total, 2)
+    economie = (couts_arrondis.max(axis=1) - couts_arrondis[rows, best] if cout_total.shape[1] > 1
+                else np.full(len(rows), np.nan))
+
+    return {
+        "montant_emprunte": montant[:, 0],
+        "meilleure_offre": names[best],
+        "mensualite_totale": mensualite_totale[rows, best],
+        "cout_total": cout_total[rows, best],
+        "cout_credit": cout_total[rows, best] - montant[:, 0],
+        "taeg": taeg[rows, best],
+        "meilleur_taeg_offre": np.where(has_taeg, names[best_taeg], ""),
+        "meilleur_taeg": np.where(has_taeg, taeg[rows, best_taeg], np.nan),
+        "economie": economie,
+        "error": np.full(len(rows), ""),
+    }
+
+
+def _parse_floats(cells, fill: str) -> np.ndarray:
+    """Conversion en bloc ; en cas de cellule illisible, repli cellule par cellule (NaN)."""
+    cells = [cell or fill for cell in cells]
+    try:
+        return np.array(cells, dtype=np.float64)
+    except ValueError:
+        values = np.empty(len(cells))
+        for k, cell in enumerate(cells):
+            try:
+                values[k] = float(cell)
+            except ValueError:
+                values[k] = np.nan
+        return values
+
+
+def _columns_from_rows(header, rows, spec, id_column):
+    """Décode un bloc CSV en tableaux numpy ; cellule vide = valeur par défaut.
+
+    Renvoie aussi le masque des lignes invalides (nombre de champs incorrect,
+    valeur illisible ou champ obligatoire vide) : elles sont signalées en
+    sortie au lieu d'interrompre le traitement.
+    """
+    index = {name: i for i, name in enumerate(header)}
+    missing = [name for name, default in spec.items() if default is None and name not in index]
+    if missing:
+        raise ValueError(f"Colonnes obligatoires absentes: {', '.join(missing)}")
+
+    invalid = np.array([len(row) != len(header) for row in rows], dtype=bool)
+    cols = {}
+    for name, default in spec.items():
+        if name not in index:
+            cols[name] = np.full(len(rows), default, dtype=np.float64)
+            continue
+        i = index[name]
+        cells = [row[i] if i < len(row) else "" for row in rows]
+        cols[name] = _parse_floats(cells, "nan" if default is None else repr(default))
+        invalid |= np.isnan(cols[name])
+    ids = None
+    if id_column in index:
+        i = index[id_column]
+        ids = [row[i] if i < len(row) else "" for row in rows]
+    return cols, ids, invalid
+
+
+def _columns_from_arrays(chunk, spec, id_column):
+    """Colonnes d'un lot Parquet ; valeur manquante = valeur par défaut."""
+    missing = [name for name, default in spec.items() if default is None and name not in chunk]
+    if missing:
+        raise ValueError(f"Colonnes obligatoires absentes: {', '.join(missing)}")
+
+    invalid = np.zeros(chunk["__rows__"], dtype=bool)
+    cols = {}
+    for name, default in spec.items():
+        if name not in chunk:
+            cols[name] = np.full(chunk["__rows__"], default, dtype=np.float64)
+            continue
+        values = np.asarray(chunk[name], dtype=np.float64)
+        cols[name] = values if default is None else np.where(np.isnan(values), default, values)
+        invalid |= np.isnan(cols[name])
+    return cols, chunk.get(id_column), invalid
+
+
+def _quote(value: str) -> str:
+    if any(c in value for c in ',"\n\r'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _format_csv(ids, result, output):
+    """Sérialise un bloc en CSV avec une seule chaîne de format par ligne (bien plus rapide que csv.writer)."""
+    formats, columns = [], []
+    if ids is not None:
+        formats.append("%s")
+        columns.append([_quote(str(v)) for v in ids])
+    for name in output:
+        values = result[name]
+        if values.dtype.kind != "f":
+            formats.append("%s")
+            columns.append([_quote(v) for v in values.astype(str).tolist()])
+        elif np.isfinite(values).all():
+            formats.append(f"%.{OUTPUT_DECIMALS.get(name, 2)}f")
+            columns.append(values.tolist())
+        else:
+            # Valeurs manquantes (TAEG non convergé...) : cellule vide
+            cell = f"%.{OUTPUT_DECIMALS.get(name, 2)}f"
+            formats.append("%s")
+            columns.append([cell % v if np.isfinite(v) else "" for v in values.tolist()])
+
+    line = ",".join(formats) + "\n"
+    return "".join([line % row for row in zip(*columns)])
+
+
+def score_chunk(task):
+    """Travail d'un processus : décode, calcule et sérialise un bloc."""
+    mode, chunk, params = task
+    spec = CAPACITY_COLUMNS if mode == "capacity" else OFFERS_COLUMNS
+    id_column = params["id_column"]
+
+    if params["input_format"] == "csv":
+        header, lines = chunk
+        # Une ligne vide n'est pas un enregistrement : pas de ligne de sortie correspondante
+        rows = [row for row in csv.reader(io.StringIO(b"".join(lines).decode("utf-8", errors="replace"), newline="")) if row]
+        cols, ids, invalid = _columns_from_rows(header, rows, spec, id_column)
+    else:
+        cols, ids, invalid = _columns_from_arrays(chunk, spec, id_column)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        result = score_capacity(cols) if mode == "capacity" else score_offers(cols, params["offers"])
+    output = CAPACITY_OUTPUT if mode == "capacity" else OFFERS_OUTPUT
+
+    if invalid.any():
+        for name in output:
+            values = result[name]
+            result[name] = np.where(invalid, np.nan if values.dtype.kind == "f" else "", values)
+        result["error"] = np.where(invalid, INVALID_ROW_ERROR, result["error"])
+
+    if params["output_format"] == "csv":
+        return len(cols[next(iter(spec))]), _format_csv(ids, result, output)
+    columns = {id_column: ids} if ids is not None else {}
+    columns.update({
+        name: np.round(result[name], OUTPUT_DECIMALS.get(name, 2)) if result[name].dtype.kind == "f" else result[name]
+        for name in output
+    })
+    return len(cols[next(iter(spec))]), columns
+
+
+def _format_of(path: str) -> str:
+    return "parquet" if path.endswith((".parquet", ".pq")) else "csv"
+
+
+def _require_pyarrow():
+    if pq is None:
+        raise SystemExit("Le format Parquet nécessite pyarrow (pip install pyarrow)")
+
+
+def read_chunks(path: str, chunk_size: int, input_format: str):
+    """Itère sur (bloc, octets lus, octets totaux) ; les blocs CSV restent du texte brut."""
+    if input_format == "parquet":
+        _require_pyarrow()
+        parquet = pq.ParquetFile(path)
+        total, done = parquet.metadata.num_rows, 0
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            chunk = {name: batch.column(name).to_numpy(zero_copy_only=False) for name in batch.schema.names}
+            chunk["__rows__"] = batch.num_rows
+            done += batch.num_rows
+            yield chunk, done, total
+        return
+
+    # Lignes brutes en octets : le décodage se fait dans les workers et la progression est exacte
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        total = os.path.getsize(path) if path != "-" else None
+        header = next(csv.reader([stream.readline().decode("utf-8-sig")]))
+        done = 0
+        lines, records = [], 0
+        open_quotes = False
+        for line in stream:
+            lines.append(line)
+            done += len(line)
+            # Un enregistrement se termine sur une fin de ligne hors guillemets : un champ
+            # entre guillemets contenant un saut de ligne n'est jamais coupé entre deux blocs
+            if line.count(b'"') % 2:
+                open_quotes = not open_quotes
+            if open_quotes:
+                continue
+            records += 1
+            if records >= chunk_size:
+                yield (header, lines), done, total
+                lines, records = [], 0
+        if lines:
+            yield (header, lines), done, total
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+class ChunkWriter:
+    def __init__(self, path: str, output_format: str, header):
+        self.output_format = output_format
+        self.header = header
+        self._parquet = None
+        if output_format == "parquet":
+            _require_pyarrow()
+            self.path = path
+        else:
+            self._stream = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+            self._stream.write(",".join(header) + "\n")
+
+    def write(self, chunk):
+        if self.output_format == "csv":
+            self._stream.write(chunk)
+            return
+        table = pa.table({name: chunk[name] for name in self.header if name in chunk})
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self.path, table.schema)
+        self._parquet.write_table(table)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        elif self.output_format == "csv" and self._stream is not sys.stdout:
+            self._stream.close()
+
+
+def load_offers(path: str) -> dict:
+    """Offres à comparer (CSV ou JSON : bank_name, taux, duree, frais_dossier, assurance...)."""
+    with open(path, encoding="utf-8") as f:
+        records = json.load(f) if path.endswith(".json") else list(csv.DictReader(f))
+    if not records:
+        raise SystemExit(f"{path}: aucune offre")
+
+    offers = {"bank_name": np.array([str(r.get("bank_name", f"offre_{i + 1}")) for i, r in enumerate(records)])}
+    for name, default in OFFER_FIELDS.items():
+        if default is None and any(r.get(name) in (None, "") for r in records):
+            raise SystemExit(f"{path}: champ obligatoire absent: {name}")
+        offers[name] = np.array([float(r.get(name) or default or 0) for r in records], dtype=np.float64)
+    return offers
+
+
+def _report(rows: int, start: float, done: int, total, final: bool = False):
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    progress = f" ({done / total * 100:5.1f} %)" if total else ""
+    sys.stderr.write(f"\r{rows:>12,} lignes{progress}  {rate:>10,.0f} lignes/s  {elapsed:7.1f} s")
+    if final:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def run(args) -> int:
+    input_format, output_format = _format_of(args.input), _format_of(args.output)
+    if "-" in (args.input, args.output) and "parquet" in (input_format, output_format):
+        raise SystemExit("stdin/stdout ne sont possibles qu'en CSV")
+
+    params = {
+        "id_column": args.id_column,
+        "input_format": input_format,
+        "output_format": output_format,
+        "offers": load_offers(args.offers) if args.mode == "offers" else None,
+    }
+    output = CAPACITY_OUTPUT if args.mode == "capacity" else OFFERS_OUTPUT
+    chunks = read_chunks(args.input, args.chunk_size, input_format)
+
+    # En-tête de sortie : l'identifiant n'est recopié que s'il existe dans l'entrée
+    first = next(chunks, None)
+    if first is None:
+        raise SystemExit(f"{args.input}: fichier vide")
+    columns = first[0][0] if input_format == "csv" else first[0]
+    spec = CAPACITY_COLUMNS if args.mode == "capacity" else OFFERS_COLUMNS
+    missing = [name for name, default in spec.items() if default is None and name not in columns]
+    if missing:
+        raise SystemExit(f"{args.input}: colonnes obligatoires absentes: {', '.join(missing)}")
+    has_id = args.id_column in columns
+    writer = ChunkWriter(args.output, output_format, ([args.id_column] if has_id else []) + list(output))
+
+    rows, start = 0, time.perf_counter()
+    max_in_flight = 2 * args.workers
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        pending = deque()
+        try:
+            for chunk, done, total in _prepend(first, chunks):
+                pending.append((pool.submit(score_chunk, (args.mode, chunk, params)), done, total))
+                while len(pending) >= max_in_flight:
+                    rows = _drain(pending.popleft(), writer, rows, start)
+            while pending:
+                rows = _drain(pending.popleft(), writer, rows, start)
+        finally:
+            for future, _, _ in pending:
+                future.cancel()
+            writer.close()
+
+    _report(rows, start, None, None, final=True)
+    return rows
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+
+def _drain(item, writer, rows, start):
+    future, done, total = item
+    n, chunk = future.result()
+    writer.write(chunk)
+    rows += n
+    _report(rows, start, done, total)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring hors ligne de dossiers de prêt (CSV ou Parquet)")
+    parser.add_argument("mode", choices=("capacity", "offers"),
+                        help="capacity : capacité d'emprunt ; offers : comparaison multi-offres")
+    parser.add_argument("input", help="fichier d'entrée (.csv, .parquet) ou - pour stdin")
+    parser.add_argument("output", help="fichier de sortie (.csv, .parquet) ou - pour stdout")
+    parser.add_argument("--offers", help="offres à comparer (CSV ou JSON), mode offers")
+    parser.add_argument("--id-column", default="id", help="colonne recopiée telle quelle en sortie")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if args.mode == "offers" and not args.offers:
+        parser.error("--offers est obligatoire en mode offers")
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Micro-benchmarks des moteurs de calcul.
+
+Usage :
+    python bench.py taeg [--n 100000]
+    python bench.py alerts [--n 1000000]
+    python bench.py admission [--heavy 2000] [--cheap 200]
+    python bench.py portfolio [--n 1000] [--years 25]
+    python bench.py package [--pas 2000]
+    python bench.py backtest [--duree 360]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+
+def _timed(fn, repeat=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_taeg(args):
+    from taeg import compute_taeg
+
+    rng = np.random.default_rng(0)
+    n = args.n
+    montant = rng.uniform(50_000, 600_000, n)
+    taux = rng.uniform(0.5, 6.0, n)
+    duree = rng.choice([120, 180, 240, 300, 360], n)
+    frais = rng.uniform(0, 2_000, n)
+    taux_assurance = np.where(rng.random(n) < 0.5, rng.uniform(0.1, 0.5, n), 0.0)
+    assurance = rng.uniform(10, 80, n)
+
+    elapsed, result = _timed(lambda: compute_taeg(montant, taux, duree, frais, assurance, taux_assurance))
+    print(f"taeg: {n} offres en {elapsed * 1000:.1f} ms "
+          f"({n / elapsed:,.0f} offres/s, {result['iterations']} itérations, "
+          f"{np.count_nonzero(~result['converged'])} non convergées)")
+
+
+def bench_alerts(args):
+    from rate_alerts import ALERT_DURATIONS, AlertIndex
+
+    rng = np.random.default_rng(0)
+    banks = [f"Banque {i}" for i in range(20)]
+    n = args.n
+    bank_choice = rng.integers(-1, len(banks), n)  # -1 = toutes les banques
+    durations = rng.choice(ALERT_DURATIONS, n)
+    thresholds = np.round(rng.uniform(2.0, 5.0, n), 2)
+    directions = np.where(rng.random(n) < 0.8, "below", "above")
+    subscriptions = [
+        (f"sub{i}", banks[b] if b >= 0 else None, int(d), float(t), str(direction))
+        for i, (b, d, t, direction) in enumerate(zip(bank_choice, durations, thresholds, directions))
+    ]
+
+    index = AlertIndex()
+    start = time.perf_counter()
+    index.bulk_load(subscriptions)
+    print(f"alerts: index de {len(index)} abonnements construit en {time.perf_counter() - start:.2f} s")
+
+    # Mise à jour réaliste : chaque taux bouge de quelques points de base
+    old_rates = {(bank, d): float(rng.uniform(3.0, 4.0)) for bank in banks for d in ALERT_DURATIONS}
+    new_rates = {key: round(rate + rng.choice([-0.05, -0.02, 0.0, 0.02, 0.05]), 2) for key, rate in old_rates.items()}
+
+    start = time.perf_counter()
+    triggered = index.match(old_rates, new_rates)
+    elapsed = time.perf_counter() - start
+    print(f"alerts: {len(triggered)} alertes déclenchées en {elapsed * 1000:.1f} ms "
+          f"({len(new_rates)} taux comparés, {len(index)} abonnements restants)")
+
+
+def bench_admission(args):
+    """Surcharge d'exports PDF et d'optimisations ; mesure le p99 de /calculate avec et sans admission."""
+    import httpx
+    from main import app, admission_controller
+
+    heavy_requests = [
+        ("/export/pdf", {"type": "basic", "prix_bien": 250000, "apport": 25000, "montant_emprunte": 225000}),
+        ("/calculate/optimization", {"salaire": 5000, "charges": 300, "prix_bien": 250000, "taux": 0.035,
+                                     "duree_min": 12, "duree_max": 480}),
+    ]
+    cheap_request = ("/calculate", {"salaire": 4000, "charges": 200, "taux": 3.5, "duree": 240})
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            async def timed(path, body):
+                start = time.perf_counter()
+                response = await client.post(path, json=body)
+                return response.status_code, time.perf_counter() - start
+
+            async def cheap_stream():
+                # Charge en boucle ouverte : la latence part de l'instant d'envoi prévu,
+                # pour compter aussi le temps où la boucle était trop occupée pour envoyer
+                start = time.perf_counter()
+
+                async def one(i):
+                    intended = start + i * 0.005
+                    await asyncio.sleep(max(0.0, intended - time.perf_counter()))
+                    await client.post(cheap_request[0], json=cheap_request[1])
+                    return time.perf_counter() - intended
+
+                return await asyncio.gather(*(one(i) for i in range(args.cheap)))
+
+            async def heavy_producer():
+                # Rafales de 20 requêtes lourdes toutes les 10 ms : bien au-delà de la capacité
+                tasks = []
+                for i in range(args.heavy):
+                    tasks.append(asyncio.create_task(timed(*heavy_requests[i % 2])))
+                    if i % 20 == 19:
+                        await asyncio.sleep(0.01)
+                return await asyncio.gather(*tasks)
+
+            producer = asyncio.create_task(heavy_producer())
+            latencies = await cheap_stream()
+            heavy_results = await producer
+            return latencies, heavy_results
+
+    for enabled in (False, True):
+        admission_controller.enabled = enabled
+        latencies, heavy_results = asyncio.run(run())
+        rejected = sum(1 for status, _ in heavy_results if status == 503)
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        print(f"admission {'activée ' if enabled else 'désactivée'}: /calculate p50 {p50:.1f} ms, p99 {p99:.1f} ms ; "
+              f"{args.heavy} requêtes lourdes dont {rejected} rejetées en 503")
+    print(json.dumps(admission_controller.stats()["classes"], indent=2))
+
+
+def bench_portfolio(args):
+    from portfolio import simulate_portfolio, stream_portfolio
+
+    rng = np.random.default_rng(0)
+    n = args.n
+    prix = rng.uniform(80_000, 400_000, n)
+    properties = {
+        "prix_bien": prix,
+        "apport": prix * rng.uniform(0.0, 0.3, n),
+        "taux": rng.uniform(2.5, 4.5, n),
+        "duree": rng.choice([180, 240, 300], n),
+        "loyer_mensuel": prix * rng.uniform(0.004, 0.007, n),
+        "charges_mensuelles": prix * rng.uniform(0.0005, 0.001, n),
+        "indexation_loyer": np.full(n, 1.5),
+        "vacance": rng.uniform(2, 8, n),
+        "croissance_charges": np.full(n, 2.0),
+        "taux_imposition": np.full(n, 30.0),
+        "revalorisation": rng.uniform(0, 2, n),
+        "frais_revente": np.full(n, 5.0),
+        "frais_acquisition": np.full(n, 7.5),
+    }
+
+    def run():
+        result = simulate_portfolio(properties, args.years, 4.0)
+        return result, sum(len(line) for line in stream_portfolio(result))
+
+    elapsed, (result, size) = _timed(run)
+    print(f"portfolio: {n} biens sur {args.years} ans en {elapsed * 1000:.1f} ms "
+          f"(réponse {size / 1024:.0f} Ko, TRI portefeuille {result['tri_portefeuille']:.2f} %, "
+          f"{np.count_nonzero(np.isnan(result['tri']))} biens sans TRI)")
+
+
+def bench_package(args):
+    from loan_package import optimize_package
+
+    tranches = [
+        {"nom": "PTZ", "taux": 0.0, "duree": 240, "differe": 60, "montant_max": 60000, "pas": args.pas},
+        {"nom": "Employeur", "taux": 1.0, "duree": 120, "montant_max": 30000, "pas": args.pas},
+        {"nom": "Action Logement", "taux": 1.0, "duree": 300, "montant_max": 40000, "pas": args.pas},
+    ]
+    durees = list(range(120, 301, 12))
+    optimize_package(270000, 3.6, durees, tranches, 1800)  # échauffement
+
+    elapsed, result = _timed(lambda: optimize_package(270000, 3.6, durees, tranches, 1800))
+    print(f"package: {result['n_candidates']} montages évalués en {elapsed * 1000:.1f} ms "
+          f"({result['n_viables']} viables)")
+
+
+def bench_backtest(args):
+    from backtest import backtest_variable_loan, get_series
+
+    get_series()
+    backtest_variable_loan(200000, args.duree, 1.0, complet_uniquement=False)  # échauffement
+
+    elapsed, result = _timed(lambda: backtest_variable_loan(200000, args.duree, 1.0, complet_uniquement=False))
+    print(f"backtest: {len(result['departs'])} dates de départ sur {args.duree} mois en {elapsed * 1000:.2f} ms "
+          f"(coût médian {np.median(result['cout_credit']):,.0f} €)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("taeg", help="TAEG vectorisé sur un lot d'offres")
+    p.add_argument("--n", type=int, default=100_000)
+    p.set_defaults(func=bench_taeg)
+
+    p = sub.add_parser("alerts", help="Appariement des alertes de taux après une mise à jour")
+    p.add_argument("--n", type=int, default=1_000_000)
+    p.set_defaults(func=bench_alerts)
+
+    p = sub.add_parser("admission", help="Charge lourde contre latence des routes gratuites")
+    p.add_argument("--heavy", type=int, default=2000)
+    p.add_argument("--cheap", type=int, default=200)
+    p.set_defaults(func=bench_admission)
+
+    p = sub.add_parser("portfolio", help="Simulation de portefeuille locatif (flux, TRI, VAN)")
+    p.add_argument("--n", type=int, default=1000)
+    p.add_argument("--years", type=int, default=25)
+    p.set_defaults(func=bench_portfolio)
+
+    p = sub.add_parser("package", help="Recherche de montage multi-prêts avec lissage")
+    p.add_argument("--pas", type=float, default=2000)
+    p.set_defaults(func=bench_package)
+
+    p = sub.add_parser("backtest", help="Backtest historique d'un prêt variable capé")
+    p.add_argument("--duree", type=int, default=360)
+    p.set_defaults(func=bench_backtest)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, String, Float, DateTime, Boolean
+from sqlalchemy import create_engine, Column, String, Float, DateTime, Boolean, Integer, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -26,6 +26,36 @@ class BankRate(Base):
     source_url = Column(String, nullable=True)
     is_promotional = Column(Boolean, default=False)
 
+class RateAlertSubscription(Base):
+    __tablename__ = "rate_alert_subscriptions"
+
+    id = Column(String, primary_key=True)
+    bank_name = Column(String, nullable=True)  # None = toutes les banques
+    duree = Column(Integer)  # en mois : 120, 180, 240, 300 ou 360
+    threshold = Column(Float)
+    direction = Column(String, default="below")  # below ou above
+    created_at = Column(DateTime, default=datetime.utcnow)
+    triggered_at = Column(DateTime, nullable=True)
+    triggered_bank = Column(String, nullable=True)
+    triggered_rate = Column(Float, nullable=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String)
+    payload = Column(Text)  # JSON
+    dedup_key = Column(String, index=True)
+    priority = Column(Integer, default=0)
+    status = Column(String, default="queued")  # queued, running, done, failed
+    progress = Column(Float, default=0)
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
@@ -0,0 +1,48 @@
+"""Résolutions inverses de la formule d'annuité, sur des lots de cibles.
+
+À partir d'une mensualité cible on retrouve le capital (forme fermée), la
+durée (forme fermée par logarithme) ou le taux (Newton vectorisé).
+Les cibles impossibles (mensualité négative ou nulle, durée nulle, mensualité
+qui ne couvre pas les intérêts ou ne rembourse pas le capital, taux hors
+encadrement) ressortent en NaN.
+"""
+import numpy as np
+
+from loan_math import present_value_factor, solve_monthly_rate
+
+
+def solve_principal(mensualite, taux, duree):
+    """Capital empruntable pour une mensualité, un taux (% annuel) et une durée en mois."""
+    mensualite = np.asarray(mensualite, dtype=np.float64)
+    duree = np.asarray(duree, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        montant = mensualite * present_value_factor(np.asarray(taux, dtype=np.float64) / 100 / 12, duree)
+    # Sans mensualité positive ni au moins une échéance, rien n'est empruntable
+    return np.where((mensualite > 0) & (duree >= 1), montant, np.nan)
+
+
+def solve_duration(mensualite, montant, taux):
+    """Durée (en mois, non arrondie) pour rembourser ``montant`` avec ``mensualite``.
+
+    n = -ln(1 - C.r / M) / ln(1 + r) ; n = C / M si r == 0.
+    """
+    mensualite = np.asarray(mensualite, dtype=np.float64)
+    montant = np.asarray(montant, dtype=np.float64)
+    r = np.asarray(taux, dtype=np.float64) / 100 / 12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = montant * r / mensualite
+        n = -np.log1p(-ratio) / np.log1p(r)
+        n = np.where(r == 0, montant / mensualite, n)
+    # La mensualité doit couvrir au moins les intérêts du premier mois
+    return np.where((mensualite > 0) & (ratio < 1), n, np.nan)
+
+
+def solve_rate(mensualite, montant, duree):
+    """Taux annuel nominal (%) pour lequel ``montant`` sur ``duree`` mois coûte ``mensualite``."""
+    mensualite = np.asarray(mensualite, dtype=np.float64)
+    montant = np.asarray(montant, dtype=np.float64)
+    duree = np.asarray(duree, dtype=np.float64)
+    q, converged, _ = solve_monthly_rate(montant, mensualite, duree)
+    # Des mensualités qui ne remboursent même pas le capital donneraient un taux négatif
+    rembourse = mensualite * duree >= montant
+    return np.where(converged & rembourse, np.maximum(q, 0.0) * 12 * 100, np.nan)
@@ -0,0 +1,277 @@
+"""File de travaux locale pour les simulations lourdes et les exports.
+
+Une soumission renvoie immédiatement un identifiant ; le travail est exécuté
+par un pool borné de workers (threads, pour ne pas bloquer la boucle
+asyncio). Chaque type a sa file ; les démarrages sont répartis entre types
+au prorata des crédits que coûte la fonctionnalité (ordonnancement par pas,
+« stride scheduling »), si bien qu'un flot de travaux chers ne bloque
+jamais indéfiniment les exports. L'état est conservé dans la table ``jobs`` de
+SQLite : au redémarrage, les travaux en attente ou interrompus sont remis
+en file. Les résultats expirent après RESULT_TTL et deux soumissions
+identiques encore valides partagent le même travail. Aucun broker externe.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, Optional
+
+from database import SessionLocal, Job
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+MAX_QUEUED_JOBS = 1000
+RESULT_TTL = timedelta(hours=1)
+CLEANUP_INTERVAL_SECONDS = 600
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobKind:
+    def __init__(self, name: str, handler: Callable, credits: int, model=None):
+        self.name = name
+        self.handler = handler  # handler(payload, progress) -> dict JSON-sérialisable
+        self.credits = credits
+        self.model = model  # modèle pydantic : le handler reçoit alors l'instance validée
+
+
+class JobManager:
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = MAX_QUEUED_JOBS,
+                 result_ttl: timedelta = RESULT_TTL):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.kinds: Dict[str, JobKind] = {}
+        # Une file par type ; _pass = temps virtuel de chaque type, avancé de 1/crédits à chaque démarrage
+        self._pending: Dict[str, Deque[str]] = {}
+        self._pass: Dict[str, float] = {}
+        self._vtime = 0.0
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks = []
+        # Progression en mémoire (trop fréquente pour SQLite) et réveil des observateurs
+        self._progress: Dict[str, float] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        # Payloads déjà validés à la soumission ; les travaux repris au démarrage sont revalidés
+        self._validated: Dict[str, object] = {}
+
+    def register(self, name: str, handler: Callable, credits: int = 0, model=None):
+        self.kinds[name] = JobKind(name, handler, credits, model)
+
+    async def start(self):
+        self._ready = asyncio.Semaphore(0)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+
+        # Reprise : les travaux interrompus par un arrêt repartent de zéro
+        db = SessionLocal()
+        try:
+            pending = db.query(Job).filter(Job.status.in_(("queued", "running"))).order_by(Job.created_at).all()
+            for job in pending:
+                job.status = "queued"
+                job.progress = 0
+                self._enqueue(job)
+            db.commit()
+            if pending:
+                logger.info(f"Requeued {len(pending)} pending jobs")
+        finally:
+            db.close()
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._cleanup_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, kind: str, payload: dict):
+        """Crée (ou retrouve) un travail ; renvoie (job, deduplicated)."""
+        job_kind = self.kinds.get(kind)
+        if job_kind is None:
+            raise ValueError(f"Type de travail inconnu: {kind}")
+        validated = None
+        if job_kind.model is not None:
+            validated = job_kind.model(**payload)
+            payload = validated.model_dump()
+
+        dedup_key = hashlib.sha256(
+            f"{kind}:{json.dumps(payload, sort_keys=True, default=str)}".encode()
+        ).hexdigest()
+
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            existing = db.query(Job).filter(
+                Job.dedup_key == dedup_key,
+                Job.status != "failed",
+                (Job.expires_at.is_(None)) | (Job.expires_at > now),
+            ).first()
+            if existing:
+                return self._to_dict(existing), True
+
+            if self.queued_count() >= self.max_queued:
+                raise JobQueueFull()
+
+            job = Job(
+                id=uuid.uuid4().hex,
+                kind=kind,
+                payload=json.dumps(payload, default=str),
+                dedup_key=dedup_key,
+                priority=job_kind.credits,
+                status="queued",
+                progress=0,
+                created_at=now,
+            )
+            db.add(job)
+            db.commit()
+            if validated is not None:
+                self._validated[job.id] = validated
+            self._enqueue(job)
+            return self._to_dict(job), False
+        finally:
+            db.close()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            return self._to_dict(job) if job else None
+        finally:
+            db.close()
+
+    async def watch(self, job_id: str, timeout: float = 15):
+        """Itère sur les états successifs d'un travail jusqu'à sa fin (None = rien de neuf)."""
+        while True:
+            event = self._changed.setdefault(job_id, asyncio.Event())
+            job = self.get(job_id)
+            yield job
+            if job is None or job["status"] in ("done", "failed"):
+                return
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                yield None
+
+    def queued_count(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def _weight(self, kind: str) -> int:
+        job_kind = self.kinds.get(kind)
+        return max(job_kind.credits if job_kind else 1, 1)
+
+    def _enqueue(self, job: Job):
+        pending = self._pending.setdefault(job.kind, deque())
+        if not pending:
+            # Un type resté vide ne cumule pas d'avance : il repart du temps virtuel courant
+            self._pass[job.kind] = max(self._pass.get(job.kind, 0.0), self._vtime)
+        pending.append(job.id)
+        self._ready.release()
+
+    def _next_job(self) -> str:
+        # Type au temps virtuel le plus bas ; à égalité, le plus cher passe devant
+        kind = min((k for k, pending in self._pending.items() if pending),
+                   key=lambda k: (self._pass[k], -self._weight(k)))
+        self._vtime = self._pass[kind]
+        self._pass[kind] += 1 / self._weight(kind)
+        return self._pending[kind].popleft()
+
+    def _notify(self, job_id: str):
+        event = self._changed.pop(job_id, None)
+        if event:
+            event.set()
+
+    def _set_progress(self, job_id: str, fraction: float):
+        self._progress[job_id] = min(max(fraction, 0.0), 1.0)
+        self._notify(job_id)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.acquire()
+            job_id = self._next_job()
+            db = SessionLocal()
+            try:
+                job = db.query(Job).filter(Job.id == job_id).first()
+                if job is None or job.status != "queued":
+                    continue
+                job.status = "running"
+                job.started_at = datetime.utcnow()
+                db.commit()
+                self._notify(job_id)
+
+                def progress(fraction: float):
+                    loop.call_soon_threadsafe(self._set_progress, job_id, fraction)
+
+                try:
+                    job_kind = self.kinds[job.kind]
+                    payload = self._validated.pop(job_id, None)
+                    if payload is None:
+                        payload = json.loads(job.payload)
+                        if job_kind.model is not None:
+                            payload = job_kind.model(**payload)
+                    result = await loop.run_in_executor(self._executor, job_kind.handler, payload, progress)
+                    job.result = json.dumps(result, default=str)
+                    job.status = "done"
+                    job.progress = 1
+                except Exception as e:
+                    logger.error(f"Job {job_id} ({job.kind}) failed: {e}")
+                    job.status = "failed"
+                    job.error = str(e)
+                job.finished_at = datetime.utcnow()
+                job.expires_at = job.finished_at + self.result_ttl
+                db.commit()
+            finally:
+                db.close()
+                self._progress.pop(job_id, None)
+                self._validated.pop(job_id, None)
+                self._notify(job_id)
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+            try:
+                self.purge_expired()
+            except Exception as e:
+                logger.error(f"Error purging expired jobs: {e}")
+
+    def purge_expired(self) -> int:
+        db = SessionLocal()
+        try:
+            expired = db.query(Job).filter(Job.expires_at.isnot(None), Job.expires_at <= datetime.utcnow()).all()
+            for job in expired:
+                # Les exports gardent leur fichier sur disque jusqu'à l'expiration
+                result = json.loads(job.result) if job.result else None
+                if isinstance(result, dict) and result.get("file") and os.path.exists(result["file"]):
+                    os.remove(result["file"])
+                db.delete(job)
+            db.commit()
+            return len(expired)
+        finally:
+            db.close()
+
+    def _to_dict(self, job: Job) -> dict:
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "progress": round(self._progress.get(job.id, job.progress or 0), 3),
+            "result": json.loads(job.result) if job.result else None,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+            "expires_at": job.expires_at.isoformat() if job.expires_at else None,
+        }
+
+
+job_manager = JobManager()
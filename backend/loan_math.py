@@ -0,0 +1,158 @@
+"""Formules d'annuité vectorisées (numpy) partagées par les endpoints."""
+import numpy as np
+
+
+def annuity_factor(taux_mensuel, duree):
+    """Mensualité pour 1 € emprunté : r / (1 - (1 + r) ** -n), ou 1 / n si r == 0.
+
+    Accepte des scalaires ou des tableaux (broadcast numpy).
+    """
+    r = np.asarray(taux_mensuel, dtype=np.float64)
+    n = np.asarray(duree, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = r / -np.expm1(-n * np.log1p(r))
+    return np.where(r == 0, 1.0 / n, factor)
+
+
+def monthly_payment(montant, taux_annuel_pct, duree):
+    """Mensualité hors assurance pour un taux annuel exprimé en %."""
+    return np.asarray(montant, dtype=np.float64) * annuity_factor(
+        np.asarray(taux_annuel_pct, dtype=np.float64) / 100 / 12, duree
+    )
+
+
+def present_value_factor(taux_mensuel, duree):
+    """Valeur actuelle de 1 € versé chaque mois pendant n mois : 1 / annuity_factor."""
+    return 1.0 / annuity_factor(taux_mensuel, duree)
+
+
+def solve_monthly_rate(capital, mensualite, duree, tol=1e-12, max_iter=60):
+    """Taux mensuel q tel que mensualite * (1 - (1 + q) ** -n) / q == capital.
+
+    Newton vectorisé protégé par un encadrement [lo, hi] (la valeur actuelle
+    décroît strictement avec q) : un pas qui sort de l'encadrement est remplacé
+    par une bissection. Retourne (q, converged, iterations).
+    """
+    capital, mensualite, duree = np.broadcast_arrays(
+        np.asarray(capital, dtype=np.float64),
+        np.asarray(mensualite, dtype=np.float64),
+        np.asarray(duree, dtype=np.float64),
+    )
+    lo = np.full(capital.shape, -0.05)
+    hi = np.full(capital.shape, 1.0)
+
+    # Développement limité de la valeur actuelle en q = 0 comme point de départ
+    q = 2 * (1 - capital / (mensualite * duree)) / (duree + 1)
+    q = np.clip(q, lo, hi)
+    converged = np.zeros(capital.shape, dtype=bool)
+
+    iterations = 0
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for iterations in range(1, max_iter + 1):
+            active = ~converged
+            if not active.any():
+                break
+
+            pv, dpv = _pv_and_derivative(q, duree)
+            f = mensualite * pv - capital
+            df = mensualite * dpv
+
+            # f décroissant : f > 0 signifie que la racine est au-dessus de q
+            lo = np.where(active & (f > 0), q, lo)
+            hi = np.where(active & (f <= 0), q, hi)
+
+            step = q - f / df
+            outside = ~np.isfinite(step) | (step < lo) | (step > hi)
+            new_q = np.where(outside, (lo + hi) / 2, step)
+
+            done = active & ((np.abs(new_q - q) <= tol * np.maximum(1.0, np.abs(q))) | (hi - lo <= tol))
+            q = np.where(active, new_q, q)
+            converged |= done
+
+        # Un encadrement qui s'est refermé sur une borne n'est pas une racine
+        pv, _ = _pv_and_derivative(q, duree)
+        converged &= np.abs(mensualite * pv - capital) <= 1e-8 * np.maximum(np.abs(capital), 1.0)
+
+    return q, converged, iterations
+
+
+def _pv_and_derivative(q, duree):
+    """Valeur actuelle de 1 €/mois sur n mois et sa dérivée par rapport à q."""
+    one_minus_disc = -np.expm1(-duree * np.log1p(q))  # 1 - (1 + q) ** -n
+    small = np.abs(q) < 1e-9
+    pv = np.where(small, duree * (1 - q * (duree + 1) / 2), one_minus_disc / q)
+    dpv = np.where(
+        small,
+        -duree * (duree + 1) / 2,
+        duree * (1 - one_minus_disc) / (1 + q) / q - one_minus_disc / q ** 2,
+    )
+    return pv, dpv
+
+
+def payment_sensitivities(montant, taux_mensuel, duree):
+    """Dérivées analytiques de la mensualité par rapport au taux mensuel et à la durée.
+
+    Avec d = (1 + r) ** -n et M = C.r / (1 - d) :
+        dM/dr = C.((1 - d) - r.n.d / (1 + r)) / (1 - d) ** 2
+        dM/dn = -C.r.ln(1 + r).d / (1 - d) ** 2
+    En r = 0 on prend les limites C.(n + 1) / (2n) et -C / n ** 2.
+    """
+    c = np.asarray(montant, dtype=np.float64)
+    r = np.asarray(taux_mensuel, dtype=np.float64)
+    n = np.asarray(duree, dtype=np.float64)
+    log_growth = np.log1p(r)
+    one_minus_d = -np.expm1(-n * log_growth)
+    d = 1 - one_minus_d
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d_taux = c * (one_minus_d - r * n * d / (1 + r)) / one_minus_d ** 2
+        d_duree = -c * r * log_growth * d / one_minus_d ** 2
+    zero = r == 0
+    d_taux = np.where(zero, c * (n + 1) / (2 * n), d_taux)
+    d_duree = np.where(zero, -c / n ** 2, d_duree)
+    return d_taux, d_duree
+
+
+def solve_irr(cash_flows, lo=-0.5, hi=1.0, tol=1e-10, max_iter=100):
+    """Taux périodique annulant la VAN de chaque ligne de ``cash_flows`` (lignes x périodes).
+
+    Newton vectorisé protégé par encadrement, comme solve_monthly_rate. Les
+    lignes sans changement de signe de la VAN sur [lo, hi] n'ont pas de
+    TRI dans l'intervalle et ressortent en NaN.
+    """
+    cf = np.atleast_2d(np.asarray(cash_flows, dtype=np.float64))
+    periods = np.arange(cf.shape[1], dtype=np.float64)
+
+    def npv_and_derivative(q):
+        disc = np.exp(-periods[None, :] * np.log1p(q)[:, None])
+        npv = (cf * disc).sum(axis=1)
+        dnpv = -(cf * periods[None, :] * disc).sum(axis=1) / (1 + q)
+        return npv, dnpv
+
+    lo = np.full(cf.shape[0], lo)
+    hi = np.full(cf.shape[0], hi)
+    f_lo, _ = npv_and_derivative(lo)
+    f_hi, _ = npv_and_derivative(hi)
+    bracketed = np.sign(f_lo) != np.sign(f_hi)
+    # Orientation : on veut f(lo) > 0 > f(hi) pour réutiliser la logique de solve_monthly_rate
+    increasing = f_lo < f_hi
+
+    q = np.full(cf.shape[0], 0.005)  # ~6 % annuel, ordre de grandeur d'un TRI immobilier
+    converged = ~bracketed
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for _ in range(max_iter):
+            active = ~converged
+            if not active.any():
+                break
+            f, df = npv_and_derivative(q)
+            f = np.where(increasing, -f, f)
+            df = np.where(increasing, -df, df)
+            lo = np.where(active & (f > 0), q, lo)
+            hi = np.where(active & (f <= 0), q, hi)
+            step = q - f / df
+            outside = ~np.isfinite(step) | (step < lo) | (step > hi)
+            new_q = np.where(outside, (lo + hi) / 2, step)
+            done = active & ((np.abs(new_q - q) <= tol) | (hi - lo <= tol))
+            q = np.where(active, new_q, q)
+            converged |= done
+
+    return np.where(bracketed & converged, q, np.nan)
@@ -0,0 +1,203 @@
+"""Montage multi-prêts : prêt principal + tranches secondaires (PTZ, prêt employeur...).
+
+Chaque tranche secondaire a son taux, sa durée et un éventuel différé
+(intérêts seuls pendant le différé, donc aucune échéance pour un PTZ). Avec
+le lissage, la mensualité du prêt principal est ajustée mois par mois pour
+que la mensualité totale reste constante :
+
+    principal_t = max(T - secondaires_t, 0)
+
+où T est la mensualité lissée telle que la valeur actuelle des échéances du
+prêt principal, au taux du prêt principal, égale son capital. Cette valeur
+actuelle est convexe et croissante en T, linéaire par morceaux : un Newton
+partant d'au-dessus de la racine y converge de façon monotone et exacte en
+quelques itérations, pour toutes les répartitions à la fois.
+
+La recherche parcourt la grille des montants de chaque tranche et des
+durées du prêt principal, et retient les montages au coût le plus faible
+dont la plus forte mensualité totale respecte le taux d'effort.
+"""
+import itertools
+import math
+from typing import List, Sequence
+
+import numpy as np
+
+from loan_math import annuity_factor
+
+MAX_PACKAGE_CANDIDATES = 200_000
+
+
+def tranche_schedule(taux_pct: float, duree: int, differe: int, horizon: int) -> np.ndarray:
+    """Échéances mensuelles d'une tranche pour 1 € emprunté, sur ``horizon`` mois."""
+    r = taux_pct / 100 / 12
+    mois = np.arange(1, horizon + 1)
+    schedule = np.zeros(horizon)
+    schedule[mois <= differe] = r
+    schedule[(mois > differe) & (mois <= duree)] = float(annuity_factor(r, duree - differe))
+    return schedule
+
+
+def smoothed_payment(capital: np.ndarray, secondaires: np.ndarray, actualisation: np.ndarray,
+                     tol: float = 1e-9, max_iter: int = 50) -> np.ndarray:
+    """Mensualité totale lissée T pour chaque ligne.
+
+    ``capital`` (C,) : capital du prêt principal ; ``secondaires`` (C, P) :
+    échéance des tranches secondaires sur chacune des P périodes du prêt
+    principal ; ``actualisation`` (P,) : somme des (1 + r) ** -t de chaque
+    période, au taux du prêt principal.
+    """
+    # Point de départ au-dessus de la racine : toutes les échéances principales y sont positives
+    T = secondaires.max(axis=1) + capital / actualisation.sum()
+    active = capital > 0
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        ecart = T[active, None] - secondaires[active]
+        positif = ecart > 0
+        f = np.where(positif, ecart, 0.0) @ actualisation - capital[active]
+        df = positif.astype(np.float64) @ actualisation
+        T[active] -= f / df
+        idx = np.flatnonzero(active)
+        active[idx[f <= tol * np.maximum(capital[active], 1.0)]] = False
+    return np.where(capital > 0, T, 0.0)
+
+
+def _amount_grid_spec(tranche: dict):
+    """(début, pas, nombre de niveaux) de la grille des montants d'une tranche, sans allouer."""
+    montant_min = tranche.get("montant_min", 0.0)
+    montant_max = tranche["montant_max"]
+    pas = tranche.get("pas") or max((montant_max - montant_min) / 10, 1.0)
+    if not (pas > 0 and np.isfinite(pas) and np.isfinite(montant_min) and np.isfinite(montant_max)):
+        raise ValueError(f"Grille de montants invalide pour la tranche {tranche.get('nom', '')}")
+    return montant_min, pas, math.floor((montant_max - montant_min) / pas + 0.5) + 1
+
+
+def _amount_grid(tranche: dict, montant_min: float, pas: float, count: int) -> np.ndarray:
+    return np.minimum(montant_min + pas * np.arange(count, dtype=np.float64), tranche["montant_max"])
+
+
+def optimize_package(montant_total: float, taux: float, durees: Sequence[int], tranches: List[dict],
+                     mensualite_max: float, lissage: bool = True, top_k: int = 5) -> dict:
+    """Évalue toutes les répartitions (montants des tranches x durée du prêt principal).
+
+    Renvoie les tableaux par candidat et les indices des meilleurs montages.
+    """
+    # Nombre de combinaisons vérifié avant de construire les grilles
+    specs = [_amount_grid_spec(t) for t in tranches]
+    n_candidates = math.prod(count for _, _, count in specs) * len(durees)
+    if n_candidates > MAX_PACKAGE_CANDIDATES:
+        raise ValueError(f"Trop de combinaisons ({n_candidates}), maximum {MAX_PACKAGE_CANDIDATES}")
+
+    grids = [_amount_grid(t, *spec) for t, spec in zip(tranches, specs)]
+
+    combos = list(itertools.product(*grids))
+    splits = np.array(combos, dtype=np.float64).reshape(len(combos), len(tranches))
+    capital = montant_total - splits.sum(axis=1)
+    splits, capital = splits[capital >= 0], capital[capital >= 0]
+
+    horizon = max([*durees, *(t["duree"] for t in tranches)])
+    unit = np.array([
+        tranche_schedule(t["taux"], t["duree"], t.get("differe", 0), horizon) for t in tranches
+    ]).reshape(len(tranches), horizon)
+
+    # Les échéances ne changent qu'aux fins de différé et de tranche : on travaille par
+    # périodes constantes plutôt que par mois (quelques colonnes au lieu de plusieurs centaines)
+    bornes = sorted({0, horizon, *durees, *(t["duree"] for t in tranches), *(t.get("differe", 0) for t in tranches)})
+    debuts, fins = np.array(bornes[:-1]), np.array(bornes[1:])
+    longueurs = (fins - debuts).astype(np.float64)
+    secondaires = splits @ unit[:, debuts]  # (répartitions, périodes)
+    total_secondaires = secondaires @ longueurs
+
+    r = taux / 100 / 12
+    actualisation_cumulee = np.concatenate([[0.0], np.cumsum(np.exp(-np.arange(1, horizon + 1) * np.log1p(r)))])
+    poids = actualisation_cumulee[fins] - actualisation_cumulee[debuts]
+
+    rows = []
+    for duree in durees:
+        n = int(np.searchsorted(fins, duree)) + 1  # périodes couvertes par le prêt principal
+        pendant = secondaires[:, :n]
+        apres = secondaires[:, n:]
+
+        if lissage:
+            T = smoothed_payment(capital, pendant, poids[:n])
+            principal_total = np.maximum(T[:, None] - pendant, 0.0) @ longueurs[:n]
+            pic_pendant = np.maximum(T, pendant.max(axis=1))
+        else:
+            T = capital * float(annuity_factor(r, duree))
+            principal_total = T * duree
+            pic_pendant = T + pendant.max(axis=1)
+
+        pic = np.maximum(pic_pendant, apres.max(axis=1)) if apres.shape[1] else pic_pendant
+        rows.append((np.full(len(splits), duree), T, pic, principal_total + total_secondaires))
+
+    duree_principal, mensualite_lissee, mensualite_pic, total_rembourse = (np.concatenate(c) for c in zip(*rows))
+    montants = np.tile(splits, (len(durees), 1))
+    capital_principal = np.tile(capital, len(durees))
+    cout_credit = total_rembourse - montant_total
+
+    viable = np.flatnonzero(mensualite_pic <= mensualite_max)
+    best = viable[np.argsort(cout_credit[viable], kind="stable")][:top_k]
+
+    return {
+        "montants": montants,
+        "capital_principal": capital_principal,
+        "duree_principal": duree_principal,
+        "mensualite_lissee": mensualite_lissee,
+        "mensualite_pic": mensualite_pic,
+        "cout_credit": cout_credit,
+        "n_candidates": len(cout_credit),
+        "n_viables": len(viable),
+        "best": best,
+        "unit": unit,
+        "taux": taux,
+        "lissage": lissage,
+    }
+
+
+def package_schedule(result: dict, idx: int, tranches: List[dict]) -> List[dict]:
+    """Paliers de l'échéancier d'un montage : périodes où toutes les mensualités sont constantes."""
+    duree = int(result["duree_principal"][idx])
+    secondaires = result["montants"][idx][:, None] * result["unit"]  # (tranches, horizon)
+    # Fin du montage : dernière échéance du prêt principal ou d'une tranche utilisée
+    payees = np.flatnonzero(secondaires.any(axis=0))
+    horizon = max(duree, int(payees[-1]) + 1 if len(payees) else 0)
+    secondaires = secondaires[:, :horizon]
+
+    principal = np.zeros(horizon)
+    if result["lissage"]:
+        principal[:duree] = np.maximum(result["mensualite_lissee"][idx] - secondaires[:, :duree].sum(axis=0), 0.0)
+    else:
+        principal[:duree] = result["mensualite_lissee"][idx]
+
+    lignes = np.round(np.vstack([principal, secondaires]), 2)
+    changements = np.flatnonzero(np.any(lignes[:, 1:] != lignes[:, :-1], axis=0)) + 1
+    debuts = np.concatenate([[0], changements])
+    fins = np.concatenate([changements, [horizon]])
+
+    paliers = []
+    for debut, fin in zip(debuts.tolist(), fins.tolist()):
+        paliers.append({
+            "du_mois": debut + 1,
+            "au_mois": fin,
+            "mensualite_principal": float(lignes[0, debut]),
+            "tranches": {t["nom"]: float(lignes[i + 1, debut]) for i, t in enumerate(tranches)},
+            "mensualite_totale": round(float(lignes[:, debut].sum()), 2),
+        })
+    return paliers
+
+
+def describe_candidate(result: dict, idx: int, tranches: List[dict], revenu_total: float,
+                       charges: float, schedule: bool = False) -> dict:
+    candidate = {
+        "duree_principal": int(result["duree_principal"][idx]),
+        "montant_principal": round(float(result["capital_principal"][idx]), 2),
+        "tranches": {t["nom"]: round(float(m), 2) for t, m in zip(tranches, result["montants"][idx])},
+        "mensualite_lissee": round(float(result["mensualite_lissee"][idx]), 2),
+        "mensualite_max": round(float(result["mensualite_pic"][idx]), 2),
+        "cout_credit": round(float(result["cout_credit"][idx]), 2),
+        "taux_effort": round((float(result["mensualite_pic"][idx]) + charges) / revenu_total * 100, 1),
+    }
+    if schedule:
+        candidate["paliers"] = package_schedule(result, idx, tranches)
+    return candidate
@@ -1,16 +1,29 @@
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Callable, Optional, List, Dict
 import os
 import stripe
 from dotenv import load_dotenv
 import math
+import numpy as np
 from datetime import datetime
 from sqlalchemy.orm import Session
-from database import get_db, BankRate
+from database import get_db, BankRate, RateAlertSubscription
 from rate_fetcher import update_rates
+from rate_matrix import get_rate_matrix, refresh_rate_matrix
+from rate_stream import broadcaster, format_event
+from jobs import job_manager, JobQueueFull
+from admission import AdmissionController, AdmissionMiddleware
+from loan_package import optimize_package, describe_candidate
+from backtest import backtest_variable_loan, get_series, summarize_backtest
+from portfolio import PROPERTY_FIELDS, simulate_portfolio, stream_portfolio
+from whatif import MODELS, WhatIfSession, build_models, session_store
+from rate_alerts import ALERT_DURATIONS, DIRECTIONS, load_alert_index, create_subscription, delete_subscription, stream_key
+from taeg import compute_taeg
+from surface import SURFACE_FIELDS, MAX_SURFACE_CELLS, axis, axis_count, taux_duree_surface, prix_apport_surface
+from inverse import solve_principal, solve_duration, solve_rate
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import asyncio
 import json
@@ -26,12 +39,58 @@ load_dotenv()
 
 app = FastAPI()
 
+# Tarifs des fonctionnalités (en crédits), aussi utilisés pour le contrôle d'admission
+FEATURES = {
+    "basic": {"credits": 0, "name": "Simulation basique"},
+    "variable_rate": {"credits": 2, "name": "Taux variable"},
+    "optimization": {"credits": 3, "name": "Optimisation apport/durée"},
+    "investment": {"credits": 3, "name": "Investissement locatif"},
+    "stress_test": {"credits": 2, "name": "Test de résistance"},
+    "multi_compare": {"credits": 2, "name": "Comparaison multi-offres"},
+    "full_report": {"credits": 1, "name": "Rapport PDF"}
+}
+
+# Fonctionnalité facturée par chaque route de calcul
+ROUTE_FEATURES = {
+    "/calculate": "basic",
+    "/calculate/inverse": "basic",
+    "/calculate/variable-rate": "variable_rate",
+    "/calculate/variable-rate/backtest": "variable_rate",
+    "/calculate/optimization": "optimization",
+    "/calculate/package": "optimization",
+    "/calculate/surface": "optimization",
+    "/calculate/investment": "investment",
+    "/calculate/investment/portfolio": "investment",
+    "/calculate/stress-test": "stress_test",
+    "/calculate/multi-offer": "multi_compare",
+    "/calculate/taeg": "multi_compare",
+    "/bank-rates/best-offers": "multi_compare",
+    "/export/pdf": "full_report",
+}
+
+# Limites par classe de coût (nombre de crédits) : concurrence, file d'attente, délai d'attente max (s)
+ADMISSION_LIMITS = {
+    0: {"max_concurrency": 64, "max_queue": 256, "queue_timeout": 2.0},
+    1: {"max_concurrency": 2, "max_queue": 16, "queue_timeout": 10.0},
+    2: {"max_concurrency": 4, "max_queue": 32, "queue_timeout": 5.0},
+    3: {"max_concurrency": 2, "max_queue": 16, "queue_timeout": 10.0},
+}
+
+admission_controller = AdmissionController(
+    {path: FEATURES[feature]["credits"] for path, feature in ROUTE_FEATURES.items()},
+    ADMISSION_LIMITS,
+)
+
+# Ajouté avant CORS pour que les 503 portent aussi les en-têtes CORS
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # pour le dev, restreindre en prod !
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Surface-Shape", "X-Surface-Axes", "X-Surface-Fields"],
 )
 
 # Initialize scheduler for automatic rate updates
@@ -39,7 +98,11 @@ scheduler = AsyncIOScheduler()
 
 @app.on_event("startup")
 async def startup_event():
-    # Update rates on startup
+    # Map the reference-rate series, load the stored rates, then refresh them
+    get_series()
+    refresh_rate_matrix()
+    load_alert_index()
+    await job_manager.start()
     asyncio.create_task(update_rates())
     
     # Schedule rate updates every 6 hours
@@ -55,6 +118,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     scheduler.shutdown()
+    await job_manager.stop()
 
 # Modèles de données
 class CalculateRequest(BaseModel):
@@ -73,6 +137,19 @@ class VariableRateRequest(BaseModel):
     periode_fixe: int  # Nombre de mois en taux fixe
     variation_annuelle: float  # Variation du taux variable en %
 
+class VariableBacktestRequest(BaseModel):
+    montant: float
+    duree: int  # mois
+    marge: float = 1.0  # % ajouté à l'indice
+    cap_hausse: float = 1.0  # points au-dessus du taux initial
+    cap_baisse: float = 1.0  # points en dessous du taux initial
+    periode_fixe: int = 0  # mois avant la première révision
+    revision: int = 12  # mois entre deux révisions
+    taux_fixe: Optional[float] = None  # % ; par défaut taux initial + prime_fixe à chaque départ
+    prime_fixe: float = 0.5
+    complet_uniquement: bool = True  # seulement les départs dont tout le prêt est dans l'historique
+    details: bool = False  # résultat de chaque date de départ
+
 class OptimizationRequest(BaseModel):
     salaire: float
     charges: float
@@ -90,6 +167,50 @@ class InvestmentRequest(BaseModel):
     charges_mensuelles: float
     impots_annuels: float
 
+class PortfolioProperty(BaseModel):
+    prix_bien: float
+    apport: float = 0
+    taux: float  # % annuel
+    duree: int  # mois
+    loyer_mensuel: float
+    charges_mensuelles: float = 0
+    indexation_loyer: float = 1.5  # % par an
+    vacance: float = 4  # % du temps
+    croissance_charges: float = 2  # % par an
+    taux_imposition: float = 30  # % du résultat positif
+    revalorisation: float = 1  # % par an
+    frais_revente: float = 5  # % du prix de revente
+    frais_acquisition: float = 0  # % du prix (notaire...)
+
+class PortfolioRequest(BaseModel):
+    biens: List[PortfolioProperty]
+    horizon_annees: int = 25
+    taux_actualisation: float = 4  # % annuel, pour la VAN
+
+class LoanTranche(BaseModel):
+    nom: str  # ex. PTZ, prêt employeur
+    taux: float  # % annuel
+    duree: int  # mois, différé inclus
+    differe: int = 0  # mois d'intérêts seuls
+    montant_max: float
+    montant_min: float = 0
+    pas: Optional[float] = None  # pas de la grille de recherche (défaut : 10 niveaux)
+
+class LoanPackageRequest(BaseModel):
+    salaire: float
+    autres_revenus: float = 0
+    charges: float = 0
+    taux_effort_max: float = 0.33
+    prix_bien: float
+    apport: float = 0
+    taux: float  # % annuel du prêt principal
+    duree_min: int = 120
+    duree_max: int = 300
+    duree_pas: int = 12
+    tranches: List[LoanTranche]
+    lissage: bool = True
+    top_k: int = 5
+
 class BankOffer(BaseModel):
     bank_name: str
     taux: float
@@ -103,12 +224,85 @@ class MultiOfferRequest(BaseModel):
     apport: float
     offers: List[BankOffer]
 
+class TaegOffer(BaseModel):
+    montant: float
+    taux: float
+    duree: int
+    frais_dossier: float = 0
+    assurance_mensuelle: float = 0
+    taux_assurance: float = 0
+
+class TaegBatchRequest(BaseModel):
+    offers: List[TaegOffer]
+
+class InverseTarget(BaseModel):
+    mensualite: float
+    montant: Optional[float] = None
+    taux: Optional[float] = None
+    duree: Optional[int] = None
+    apport: float = 0
+
+class InverseRequest(BaseModel):
+    solve_for: str  # montant, duree ou taux
+    targets: List[InverseTarget]
+
+class SurfaceRequest(BaseModel):
+    grille: str = "taux_duree"  # taux_duree ou prix_apport
+    format: str = "json"  # json ou binary
+    # Grille taux x durée (montant fixe)
+    montant: Optional[float] = None
+    taux_min: float = 1.0
+    taux_max: float = 6.0
+    taux_pas: float = 0.1
+    duree_min: int = 60
+    duree_max: int = 360
+    duree_pas: int = 12
+    # Grille prix x apport (taux et durée fixes)
+    taux: float = 3.5
+    duree: int = 240
+    prix_min: Optional[float] = None
+    prix_max: Optional[float] = None
+    prix_pas: float = 10000
+    apport_min: float = 0
+    apport_max: float = 0
+    apport_pas: float = 5000
+
+class BestOffersRequest(BaseModel):
+    salaire: float
+    autres_revenus: float = 0
+    charges: float = 0
+    prix_bien: float
+    apport: float = 0
+    taux_effort_max: float = 0.33
+    top_k: int = 5
+    critere: str = "cout_total"  # cout_total ou mensualite
+    abordables_uniquement: bool = True
+
+class RateAlertRequest(BaseModel):
+    bank_name: Optional[str] = None  # None = toutes les banques
+    duree: int = 240
+    threshold: float
+    direction: str = "below"  # below ou above
+
+class JobSubmitRequest(BaseModel):
+    kind: str  # optimization, investment, multi_offer, variable_rate, pdf_export
+    payload: dict
+
+class WhatIfOpenRequest(BaseModel):
+    model: str  # optimization, variable_rate ou investment
+    params: dict
+
+class WhatIfPatchRequest(BaseModel):
+    params: dict
+
 class ScenarioSaveRequest(BaseModel):
     name: str
     type: str  # basic, variable_rate, optimization, investment, stress_test
     data: dict
     results: dict
 
+build_models(OptimizationRequest, VariableRateRequest, InvestmentRequest)
+
 @app.get("/")
 def read_root():
     return {"msg": "Bienvenue sur Simulpret API"}
@@ -151,9 +345,8 @@ async def calculate(data: CalculateRequest):
         "taux_effort_utilise": data.taux_effort_max
     }
 
-@app.post("/calculate/variable-rate")
-async def calculate_variable_rate(data: VariableRateRequest):
-    """Simulation avec taux variable - Coût: 2 crédits"""
+def run_variable_rate(data: VariableRateRequest) -> dict:
+    """Simulation avec taux variable (route et file de travaux)"""
     mensualite_max = data.salaire * 0.33 - data.charges
     
     # Calcul phase taux fixe
@@ -186,12 +379,39 @@ async def calculate_variable_rate(data: VariableRateRequest):
         "credits_required": 2
     }
 
-@app.post("/calculate/optimization")
-async def optimize_loan(data: OptimizationRequest):
-    """Optimisation apport/durée - Coût: 3 crédits"""
+@app.post("/calculate/variable-rate")
+async def calculate_variable_rate(data: VariableRateRequest):
+    """Simulation avec taux variable - Coût: 2 crédits"""
+    return run_variable_rate(data)
+
+@app.post("/calculate/variable-rate/backtest")
+async def backtest_variable_rate(data: VariableBacktestRequest):
+    """Backtest historique d'un prêt variable capé sur toutes les dates de départ - Coût: 2 crédits"""
+    if data.duree <= 0 or data.revision <= 0 or not 0 <= data.periode_fixe < data.duree:
+        raise HTTPException(status_code=400, detail="Durée, période fixe ou fréquence de révision invalide")
+    if data.cap_hausse < 0 or data.cap_baisse < 0:
+        raise HTTPException(status_code=400, detail="Les caps doivent être positifs")
+    
+    try:
+        result = backtest_variable_loan(
+            data.montant, data.duree, data.marge, data.taux_fixe, data.prime_fixe,
+            data.cap_hausse, data.cap_baisse, data.periode_fixe, data.revision, data.complet_uniquement,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        **summarize_backtest(result, data.details),
+        "source": "Taux 3 mois (PIBOR puis Euribor), valeurs mensuelles approximatives",
+        "credits_required": 2
+    }
+
+def run_optimization(data: OptimizationRequest, progress: Optional[Callable[[float], None]] = None) -> dict:
+    """Parcours apport/durée ; ``progress`` reçoit l'avancement (0 à 1) après chaque durée"""
     results = []
+    durees = range(data.duree_min, data.duree_max + 1, 12)
     
-    for duree in range(data.duree_min, data.duree_max + 1, 12):
+    for i, duree in enumerate(durees):
         for apport_pct in range(0, 31, 5):  # 0% à 30% d'apport
             apport = data.prix_bien * apport_pct / 100
             montant_emprunte = data.prix_bien - apport
@@ -215,6 +435,9 @@ async def optimize_loan(data: OptimizationRequest):
                     "cout_credit": round(cout_credit, 2),
                     "taux_effort": round(taux_effort * 100, 1)
                 })
+        
+        if progress:
+            progress((i + 1) / len(durees))
     
     # Trier par coût total
     results.sort(key=lambda x: x["cout_total"])
@@ -225,9 +448,223 @@ async def optimize_loan(data: OptimizationRequest):
         "credits_required": 3
     }
 
-@app.post("/calculate/investment")
-async def calculate_investment(data: InvestmentRequest):
-    """Simulation investissement locatif - Coût: 3 crédits"""
+@app.post("/calculate/optimization")
+async def optimize_loan(data: OptimizationRequest):
+    """Optimisation apport/durée - Coût: 3 crédits"""
+    return run_optimization(data)
+
+# Durée maximale d'un prêt ou d'une tranche dans un montage
+MAX_PACKAGE_MONTHS = 480
+
+@app.post("/calculate/package")
+async def calculate_package(data: LoanPackageRequest):
+    """Montage multi-prêts avec lissage - Coût: 3 crédits"""
+    revenu_total = data.salaire + data.autres_revenus
+    mensualite_max = revenu_total * data.taux_effort_max - data.charges
+    montant_total = data.prix_bien - data.apport
+    
+    if montant_total <= 0:
+        raise HTTPException(status_code=400, detail="Rien à financer : l'apport couvre le prix du bien")
+    if data.duree_pas <= 0 or data.duree_min <= 0 or data.duree_min > data.duree_max or data.duree_max > MAX_PACKAGE_MONTHS:
+        raise HTTPException(status_code=400, detail=f"Plage de durées invalide (entre 1 et {MAX_PACKAGE_MONTHS} mois)")
+    for tranche in data.tranches:
+        if (not 0 <= tranche.differe < tranche.duree <= MAX_PACKAGE_MONTHS
+                or not 0 <= tranche.montant_min <= tranche.montant_max
+                or (tranche.pas is not None and tranche.pas <= 0)):
+            raise HTTPException(status_code=400, detail=f"Tranche {tranche.nom} invalide")
+    if data.top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k doit être au moins 1")
+    
+    tranches = [t.model_dump() for t in data.tranches]
+    try:
+        result = optimize_package(
+            montant_total, data.taux, range(data.duree_min, data.duree_max + 1, data.duree_pas),
+            tranches, mensualite_max, data.lissage, data.top_k,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    alternatives = [
+        describe_candidate(result, idx, tranches, revenu_total, data.charges, schedule=rank == 0)
+        for rank, idx in enumerate(result["best"].tolist())
+    ]
+    
+    return {
+        "optimal": alternatives[0] if alternatives else None,
+        "alternatives": alternatives[1:],
+        "montant_total": round(montant_total, 2),
+        "mensualite_max_autorisee": round(mensualite_max, 2),
+        "combinaisons_evaluees": result["n_candidates"],
+        "combinaisons_viables": result["n_viables"],
+        "credits_required": 3
+    }
+
+# Paramètres nécessaires pour chaque inconnue
+INVERSE_REQUIRED = {
+    "montant": ("taux", "duree"),
+    "duree": ("montant", "taux"),
+    "taux": ("montant", "duree"),
+}
+
+@app.post("/calculate/inverse")
+async def calculate_inverse(data: InverseRequest):
+    """Résolution inverse : prix, durée ou taux pour une mensualité cible"""
+    required = INVERSE_REQUIRED.get(data.solve_for)
+    if required is None:
+        raise HTTPException(status_code=400, detail="solve_for doit valoir 'montant', 'duree' ou 'taux'")
+    
+    for i, target in enumerate(data.targets):
+        missing = [field for field in required if getattr(target, field) is None]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Cible {i}: champs manquants {', '.join(missing)}")
+    
+    mensualite = np.array([t.mensualite for t in data.targets], dtype=np.float64)
+    columns = {field: np.array([getattr(t, field) for t in data.targets], dtype=np.float64) for field in required}
+    
+    if data.solve_for == "montant":
+        solved = solve_principal(mensualite, columns["taux"], columns["duree"])
+    elif data.solve_for == "duree":
+        solved = solve_duration(mensualite, columns["montant"], columns["taux"])
+    else:
+        solved = solve_rate(mensualite, columns["montant"], columns["duree"])
+    
+    results = []
+    for target, value in zip(data.targets, solved.tolist()):
+        if not math.isfinite(value):
+            results.append({"solvable": False, "error": "Mensualité incompatible avec les autres paramètres"})
+            continue
+        
+        if data.solve_for == "montant":
+            result = {"montant": round(value, 2), "prix_bien": round(value + target.apport, 2)}
+        elif data.solve_for == "duree":
+            # Durée en mois entiers : la dernière mensualité est plus faible
+            result = {"duree": math.ceil(value - 1e-9), "duree_exacte": round(value, 2)}
+        else:
+            result = {"taux": round(value, 4)}
+        results.append({"solvable": True, **result})
+    
+    return {
+        "solve_for": data.solve_for,
+        "results": results
+    }
+
+@app.post("/calculate/surface")
+async def calculate_surface(data: SurfaceRequest):
+    """Surfaces mensualité/coût sur une grille 2-D avec sensibilités analytiques"""
+    if data.format not in ("json", "binary"):
+        raise HTTPException(status_code=400, detail="format doit valoir 'json' ou 'binary'")
+    
+    # Taille de la grille vérifiée avant toute allocation
+    try:
+        if data.grille == "taux_duree":
+            if data.montant is None:
+                raise ValueError("montant requis pour la grille taux_duree")
+            if data.duree_min < 1:
+                raise ValueError("duree_min doit être d'au moins 1 mois")
+            row_name, row_axis = "taux", (data.taux_min, data.taux_pas)
+            col_name, col_axis = "duree", (data.duree_min, data.duree_pas)
+            shape = (axis_count(data.taux_min, data.taux_max, data.taux_pas),
+                     axis_count(data.duree_min, data.duree_max, data.duree_pas))
+        elif data.grille == "prix_apport":
+            if data.prix_min is None or data.prix_max is None:
+                raise ValueError("prix_min et prix_max requis pour la grille prix_apport")
+            if data.duree < 1:
+                raise ValueError("duree doit être d'au moins 1 mois")
+            row_name, row_axis = "prix_bien", (data.prix_min, data.prix_pas)
+            col_name, col_axis = "apport", (data.apport_min, data.apport_pas)
+            shape = (axis_count(data.prix_min, data.prix_max, data.prix_pas),
+                     axis_count(data.apport_min, data.apport_max, data.apport_pas))
+        else:
+            raise ValueError("grille doit valoir 'taux_duree' ou 'prix_apport'")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if shape[0] * shape[1] > MAX_SURFACE_CELLS:
+        raise HTTPException(status_code=400, detail=f"Grille trop grande ({shape[0]}x{shape[1]}), maximum {MAX_SURFACE_CELLS} cellules")
+    
+    rows = (row_name, axis(*row_axis, shape[0]))
+    cols = (col_name, axis(*col_axis, shape[1]))
+    if data.grille == "taux_duree":
+        surface = taux_duree_surface(data.montant, rows[1], cols[1])
+    else:
+        surface = prix_apport_surface(data.taux, data.duree, rows[1], cols[1])
+    
+    if data.format == "binary":
+        # Corps : axes puis champs, float32 little-endian, ordre C ; la description est dans les en-têtes
+        body = np.concatenate(
+            [rows[1], cols[1]] + [surface[field].ravel() for field in SURFACE_FIELDS]
+        ).astype("<f4").tobytes()
+        return Response(
+            content=body,
+            media_type="application/octet-stream",
+            headers={
+                "X-Surface-Shape": f"{shape[0]},{shape[1]}",
+                "X-Surface-Axes": f"{rows[0]},{cols[0]}",
+                "X-Surface-Fields": ",".join(SURFACE_FIELDS),
+            },
+        )
+    
+    def to_json(values):
+        return [[round(v, 2) if math.isfinite(v) else None for v in row] for row in values.tolist()]
+    
+    return {
+        "axes": {
+            rows[0]: [round(v, 4) for v in rows[1].tolist()],
+            cols[0]: [round(v, 4) for v in cols[1].tolist()]
+        },
+        "shape": list(shape),
+        **{field: to_json(surface[field]) for field in SURFACE_FIELDS}
+    }
+
+@app.post("/whatif/sessions")
+async def open_whatif_session(data: WhatIfOpenRequest):
+    """Ouvrir une session what-if : le scénario de base est calculé et gardé en mémoire"""
+    model = MODELS.get(data.model)
+    if model is None:
+        raise HTTPException(status_code=400, detail=f"model doit être parmi {sorted(MODELS)}")
+    try:
+        params = model.request_model(**data.params).model_dump()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    session = WhatIfSession(model, params)
+    result, recomputed = session.result()
+    session_store.add(session)
+    
+    return {
+        "session_id": session.id,
+        "result": result,
+        "recomputed": recomputed
+    }
+
+@app.patch("/whatif/sessions/{session_id}")
+async def patch_whatif_session(session_id: str, data: WhatIfPatchRequest):
+    """Appliquer un correctif de paramètres ; seuls les calculs dépendants sont refaits"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session inconnue ou expirée")
+    
+    with session.lock:
+        try:
+            result, recomputed = session.patch(data.params)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    session_store.touch(session)
+    
+    return {
+        "session_id": session.id,
+        "result": result,
+        "recomputed": recomputed
+    }
+
+@app.delete("/whatif/sessions/{session_id}")
+async def close_whatif_session(session_id: str):
+    if not session_store.remove(session_id):
+        raise HTTPException(status_code=404, detail="Session inconnue ou expirée")
+    return {"ok": True}
+
+def run_investment(data: InvestmentRequest) -> dict:
+    """Simulation investissement locatif (route et file de travaux)"""
     montant_emprunte = data.prix_bien - data.apport
     taux_mensuel = data.taux / 12
     mensualite = montant_emprunte * taux_mensuel / (1 - (1 + taux_mensuel) ** -data.duree)
@@ -264,6 +701,42 @@ async def calculate_investment(data: InvestmentRequest):
         "credits_required": 3
     }
 
+@app.post("/calculate/investment")
+async def calculate_investment(data: InvestmentRequest):
+    """Simulation investissement locatif - Coût: 3 crédits"""
+    return run_investment(data)
+
+# Limites du simulateur de portefeuille
+MAX_PORTFOLIO_PROPERTIES = 5000
+MAX_PORTFOLIO_HORIZON = 40
+PORTFOLIO_PERCENT_FIELDS = ("taux", "indexation_loyer", "vacance", "croissance_charges", "taux_imposition",
+                            "revalorisation", "frais_revente", "frais_acquisition")
+
+@app.post("/calculate/investment/portfolio")
+async def calculate_portfolio(data: PortfolioRequest):
+    """Portefeuille locatif : flux mensuels vectorisés, TRI/VAN par bien et global, en NDJSON annuel"""
+    if not data.biens:
+        raise HTTPException(status_code=400, detail="Le portefeuille est vide")
+    if len(data.biens) > MAX_PORTFOLIO_PROPERTIES:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_PORTFOLIO_PROPERTIES} biens")
+    if not 1 <= data.horizon_annees <= MAX_PORTFOLIO_HORIZON:
+        raise HTTPException(status_code=400, detail=f"horizon_annees doit être entre 1 et {MAX_PORTFOLIO_HORIZON}")
+    if not 0 <= data.taux_actualisation <= 100:
+        raise HTTPException(status_code=400, detail="taux_actualisation doit être un pourcentage entre 0 et 100")
+    for i, bien in enumerate(data.biens, start=1):
+        if bien.duree < 1:
+            raise HTTPException(status_code=400, detail=f"Bien {i} : la durée du prêt doit être d'au moins 1 mois")
+        if not 0 <= bien.apport <= bien.prix_bien:
+            raise HTTPException(status_code=400, detail=f"Bien {i} : l'apport doit être entre 0 et le prix du bien")
+        for field in PORTFOLIO_PERCENT_FIELDS:
+            if not 0 <= getattr(bien, field) <= 100:
+                raise HTTPException(status_code=400, detail=f"Bien {i} : {field} doit être un pourcentage entre 0 et 100")
+    
+    properties = {field: np.array([getattr(b, field) for b in data.biens], dtype=np.float64) for field in PROPERTY_FIELDS}
+    result = simulate_portfolio(properties, data.horizon_annees, data.taux_actualisation)
+    
+    return StreamingResponse(stream_portfolio(result), media_type="application/x-ndjson")
+
 @app.post("/calculate/stress-test")
 async def stress_test(data: dict):
     """Test de résistance financière - Coût: 2 crédits"""
@@ -308,6 +781,11 @@ async def stress_test(data: dict):
         "credits_required": 2
     }
 
+@app.get("/admin/admission")
+async def admission_stats():
+    """Compteurs du contrôle d'admission (attente en file, rejets) par classe de coût"""
+    return admission_controller.stats()
+
 @app.post("/track")
 async def track(request: Request):
     evt = await request.json()
@@ -356,15 +834,7 @@ async def buy_credit(data: dict):
 async def get_pricing():
     """Obtenir les tarifs des différentes fonctionnalités"""
     return {
-        "features": {
-            "basic": {"credits": 0, "name": "Simulation basique"},
-            "variable_rate": {"credits": 2, "name": "Taux variable"},
-            "optimization": {"credits": 3, "name": "Optimisation apport/durée"},
-            "investment": {"credits": 3, "name": "Investissement locatif"},
-            "stress_test": {"credits": 2, "name": "Test de résistance"},
-            "multi_compare": {"credits": 2, "name": "Comparaison multi-offres"},
-            "full_report": {"credits": 1, "name": "Rapport PDF"}
-        },
+        "features": FEATURES,
         "packs": {
             "micro": {"credits": 1, "price": 0.50, "price_per_credit": 0.50},
             "standard": {"credits": 5, "price": 2.00, "price_per_credit": 0.40},
@@ -447,20 +917,139 @@ async def get_bank_rates(db: Session = Depends(get_db)):
         "next_update": "In 6 hours"
     }
 
+@app.get("/bank-rates/stream")
+async def stream_bank_rates(request: Request):
+    """Flux SSE des changements de taux et des alertes déclenchées (remplace le polling de /bank-rates et /alerts)"""
+    last_event_id = request.headers.get("last-event-id")
+    queue, backlog = broadcaster.subscribe(last_event_id)
+    
+    # Reprise : les événements manqués sont renvoyés en entier avant la file
+    initial = "".join(backlog) if backlog else None
+    if backlog is None:
+        # Première connexion ou reprise impossible : état complet, puis uniquement des deltas
+        matrix = get_rate_matrix()
+        snapshot = [
+            {
+                "bank_name": name,
+                **{
+                    f"rate_{duree // 12}_years": (None if math.isnan(rate) else float(rate))
+                    for duree, rate in zip(matrix.durations.tolist(), matrix.rates[i])
+                }
+            }
+            for i, name in enumerate(matrix.bank_names)
+        ]
+        initial = format_event(broadcaster.last_event_id, "snapshot", {"rates": snapshot})
+        if last_event_id:
+            initial = broadcaster.reset_event() + initial
+    
+    return StreamingResponse(
+        broadcaster.stream(queue, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/bank-rates/update")
 async def force_rate_update():
     """Force an immediate update of bank rates"""
     asyncio.create_task(update_rates())
     return {"status": "Update started", "message": "Rates will be updated in the background"}
 
-@app.post("/calculate/multi-offer")
-async def compare_offers(data: MultiOfferRequest):
-    """Comparaison multi-offres - Coût: 2 crédits"""
+@app.post("/bank-rates/best-offers")
+async def find_best_offers(data: BestOffersRequest):
+    """Meilleures offres parmi toutes les banques et durées stockées"""
+    if data.critere not in ("cout_total", "mensualite"):
+        raise HTTPException(status_code=400, detail="critere doit valoir 'cout_total' ou 'mensualite'")
+    
+    montant_emprunte = data.prix_bien - data.apport
+    revenu_total = data.salaire + data.autres_revenus
+    mensualite_max = revenu_total * data.taux_effort_max - data.charges
+    
+    matrix = get_rate_matrix()
+    result = matrix.best_offers(
+        montant_emprunte,
+        mensualite_max,
+        top_k=max(data.top_k, 1),
+        critere=data.critere,
+        affordable_only=data.abordables_uniquement,
+    )
+    
+    return {
+        "montant_emprunte": round(montant_emprunte, 2),
+        "mensualite_max": round(mensualite_max, 2),
+        **result,
+        "rates_built_at": matrix.built_at.strftime("%Y-%m-%d %H:%M")
+    }
+
+def serialize_alert(sub: RateAlertSubscription) -> dict:
+    return {
+        "id": sub.id,
+        "stream_key": stream_key(sub.id),  # référence des événements ``alert`` de /bank-rates/stream
+        "bank_name": sub.bank_name,
+        "duree": sub.duree,
+        "threshold": sub.threshold,
+        "direction": sub.direction,
+        "created_at": sub.created_at.isoformat(),
+        "triggered": sub.triggered_at is not None,
+        "triggered_at": sub.triggered_at.isoformat() if sub.triggered_at else None,
+        "triggered_bank": sub.triggered_bank,
+        "triggered_rate": sub.triggered_rate
+    }
+
+@app.post("/alerts")
+async def create_rate_alert(data: RateAlertRequest, db: Session = Depends(get_db)):
+    """Créer une alerte de taux vérifiée côté serveur à chaque mise à jour"""
+    if data.duree not in ALERT_DURATIONS:
+        raise HTTPException(status_code=400, detail=f"duree doit être parmi {list(ALERT_DURATIONS)}")
+    if data.direction not in DIRECTIONS:
+        raise HTTPException(status_code=400, detail="direction doit valoir 'below' ou 'above'")
+    
+    sub = create_subscription(db, data.bank_name, data.duree, data.threshold, data.direction)
+    
+    # Taux courant pour que le client sache si le seuil est déjà atteint
+    matrix = get_rate_matrix()
+    column = ALERT_DURATIONS.index(data.duree)
+    current = [
+        float(matrix.rates[i, column])
+        for i, name in enumerate(matrix.bank_names)
+        if (data.bank_name is None or name == data.bank_name) and not math.isnan(matrix.rates[i, column])
+    ]
+    current_rate = (min(current) if data.direction == "below" else max(current)) if current else None
+    
+    return {
+        **serialize_alert(sub),
+        "current_rate": current_rate
+    }
+
+@app.get("/alerts/{alert_id}")
+async def get_rate_alert(alert_id: str, db: Session = Depends(get_db)):
+    sub = db.query(RateAlertSubscription).filter(RateAlertSubscription.id == alert_id).first()
+    if sub is None:
+        raise HTTPException(status_code=404, detail="Alerte introuvable")
+    return serialize_alert(sub)
+
+@app.delete("/alerts/{alert_id}")
+async def delete_rate_alert(alert_id: str, db: Session = Depends(get_db)):
+    if not delete_subscription(db, alert_id):
+        raise HTTPException(status_code=404, detail="Alerte introuvable")
+    return {"ok": True}
+
+def run_multi_offer(data: MultiOfferRequest) -> dict:
+    """Comparaison multi-offres (route et file de travaux)"""
     montant_emprunte = data.prix_bien - data.apport
     
     comparisons = []
     
-    for offer in data.offers:
+    # TAEG de toutes les offres en un seul passage vectorisé
+    taeg = compute_taeg(
+        montant_emprunte,
+        [o.taux for o in data.offers],
+        [o.duree for o in data.offers],
+        frais_dossier=[o.frais_dossier for o in data.offers],
+        assurance_mensuelle=[o.assurance_mensuelle for o in data.offers],
+        taux_assurance=[o.taux_assurance for o in data.offers],
+    )["taeg"] if data.offers else []
+    
+    for offer, offer_taeg in zip(data.offers, taeg):
         taux_mensuel = offer.taux / 100 / 12
         
         # Calcul mensualité hors assurance
@@ -490,6 +1079,7 @@ async def compare_offers(data: MultiOfferRequest):
             "cout_total": round(cout_total, 2),
             "cout_credit": round(cout_credit, 2),
             "taux": offer.taux,
+            "taeg": round(float(offer_taeg), 3) if math.isfinite(offer_taeg) else None,
             "duree": offer.duree
         })
     
@@ -506,126 +1096,178 @@ async def compare_offers(data: MultiOfferRequest):
         "montant_emprunte": round(montant_emprunte, 2),
         "comparisons": comparisons,
         "meilleure_offre": comparisons[0] if comparisons else None,
+        "meilleur_taeg": min(
+            (c for c in comparisons if c["taeg"] is not None), key=lambda c: c["taeg"], default=None
+        ),
         "credits_required": 2
     }
 
-@app.post("/export/pdf")
-async def export_pdf(data: dict):
-    """Export PDF du rapport - Coût: 1 crédit"""
-    try:
-        # Créer un fichier temporaire
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            # Créer le document PDF
-            doc = SimpleDocTemplate(tmp_file.name, pagesize=A4)
-            story = []
-            
-            # Styles
-            styles = getSampleStyleSheet()
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Title'],
-                fontSize=24,
-                textColor=colors.HexColor('#1a1a1a'),
-                spaceAfter=30,
-            )
+@app.post("/calculate/multi-offer")
+async def compare_offers(data: MultiOfferRequest):
+    """Comparaison multi-offres - Coût: 2 crédits"""
+    return run_multi_offer(data)
+
+@app.post("/calculate/taeg")
+async def calculate_taeg_batch(data: TaegBatchRequest):
+    """Calcul du TAEG (frais de dossier et assurance inclus) pour un lot d'offres"""
+    offers = data.offers
+    result = compute_taeg(
+        [o.montant for o in offers],
+        [o.taux for o in offers],
+        [o.duree for o in offers],
+        frais_dossier=[o.frais_dossier for o in offers],
+        assurance_mensuelle=[o.assurance_mensuelle for o in offers],
+        taux_assurance=[o.taux_assurance for o in offers],
+    )
+    
+    return {
+        "results": [
+            {
+                "taeg": round(float(t), 4) if ok else None,
+                "mensualite_totale": round(float(m), 2),
+                "converged": bool(ok)
+            }
+            for t, m, ok in zip(result["taeg"], result["mensualite_totale"], result["converged"])
+        ],
+        "nb_non_convergees": int(np.count_nonzero(~result["converged"])),
+        "iterations": result["iterations"]
+    }
+
+def build_pdf_report(data: dict, progress: Optional[Callable[[float], None]] = None) -> str:
+    """Génère le rapport PDF dans un fichier temporaire et renvoie son chemin"""
+    # Créer un fichier temporaire
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+        # Créer le document PDF
+        doc = SimpleDocTemplate(tmp_file.name, pagesize=A4)
+        story = []
+        
+        if progress:
+            # Le rendu (doc.build) domine : avancement au fil des éléments mis en page
+            total = {"n": 1}
+            def on_progress(typ, value):
+                if typ == "SIZE_EST":
+                    total["n"] = max(value, 1)
+                elif typ == "PROGRESS":
+                    progress(0.1 + 0.9 * min(value / total["n"], 1.0))
+            doc.setProgressCallBack(on_progress)
+        
+        # Styles
+        styles = getSampleStyleSheet()
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Title'],
+            fontSize=24,
+            textColor=colors.HexColor('#1a1a1a'),
+            spaceAfter=30,
+        )
+        
+        # Titre
+        story.append(Paragraph("Rapport de Simulation Immobilière", title_style))
+        story.append(Spacer(1, 20))
+        
+        # Informations générales
+        info_data = [
+            ["Type de simulation", data.get("type", "Standard")],
+            ["Date", datetime.now().strftime("%d/%m/%Y")],
+            ["Montant du bien", f"{data.get('prix_bien', 0):,.0f} €"],
+            ["Apport", f"{data.get('apport', 0):,.0f} €"],
+            ["Montant emprunté", f"{data.get('montant_emprunte', 0):,.0f} €"]
+        ]
+        
+        info_table = Table(info_data, colWidths=[200, 200])
+        info_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.white),
+            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.lightgrey, colors.white]),
+            ('PADDING', (0, 0), (-1, -1), 10),
+        ]))
+        
+        story.append(info_table)
+        story.append(Spacer(1, 30))
+        
+        # Résultats selon le type
+        if data.get("type") == "multi_offer" and "comparisons" in data:
+            story.append(Paragraph("Comparaison des Offres", styles['Heading2']))
+            story.append(Spacer(1, 10))
             
-            # Titre
-            story.append(Paragraph("Rapport de Simulation Immobilière", title_style))
-            story.append(Spacer(1, 20))
+            # Tableau des offres
+            offer_data = [["Banque", "Taux", "Durée", "Mensualité", "Coût total", "Économie"]]
             
-            # Informations générales
-            info_data = [
-                ["Type de simulation", data.get("type", "Standard")],
-                ["Date", datetime.now().strftime("%d/%m/%Y")],
-                ["Montant du bien", f"{data.get('prix_bien', 0):,.0f} €"],
-                ["Apport", f"{data.get('apport', 0):,.0f} €"],
-                ["Montant emprunté", f"{data.get('montant_emprunte', 0):,.0f} €"]
-            ]
+            for offer in data["comparisons"]:
+                offer_data.append([
+                    offer["bank_name"],
+                    f"{offer['taux']}%",
+                    f"{offer['duree']} mois",
+                    f"{offer['mensualite_totale']:,.0f} €",
+                    f"{offer['cout_total']:,.0f} €",
+                    f"{offer.get('economie', 0):,.0f} €"
+                ])
             
-            info_table = Table(info_data, colWidths=[200, 200])
-            info_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 12),
-                ('GRID', (0, 0), (-1, -1), 1, colors.white),
-                ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.lightgrey, colors.white]),
-                ('PADDING', (0, 0), (-1, -1), 10),
+            offer_table = Table(offer_data, colWidths=[100, 60, 60, 80, 80, 80])
+            offer_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
             ]))
             
-            story.append(info_table)
-            story.append(Spacer(1, 30))
-            
-            # Résultats selon le type
-            if data.get("type") == "multi_offer" and "comparisons" in data:
-                story.append(Paragraph("Comparaison des Offres", styles['Heading2']))
-                story.append(Spacer(1, 10))
-                
-                # Tableau des offres
-                offer_data = [["Banque", "Taux", "Durée", "Mensualité", "Coût total", "Économie"]]
-                
-                for offer in data["comparisons"]:
-                    offer_data.append([
-                        offer["bank_name"],
-                        f"{offer['taux']}%",
-                        f"{offer['duree']} mois",
-                        f"{offer['mensualite_totale']:,.0f} €",
-                        f"{offer['cout_total']:,.0f} €",
-                        f"{offer.get('economie', 0):,.0f} €"
-                    ])
-                
-                offer_table = Table(offer_data, colWidths=[100, 60, 60, 80, 80, 80])
-                offer_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-                ]))
-                
-                story.append(offer_table)
+            story.append(offer_table)
+        
+        elif data.get("type") == "optimization" and "alternatives" in data:
+            story.append(Paragraph("Optimisation Apport/Durée", styles['Heading2']))
+            story.append(Spacer(1, 10))
             
-            elif data.get("type") == "optimization" and "alternatives" in data:
-                story.append(Paragraph("Optimisation Apport/Durée", styles['Heading2']))
-                story.append(Spacer(1, 10))
-                
-                opt_data = [["Apport", "Durée", "Mensualité", "Coût total", "Taux d'effort"]]
-                
-                for alt in data["alternatives"][:5]:
-                    opt_data.append([
-                        f"{alt['apport']:,.0f} € ({alt['apport_pct']}%)",
-                        f"{alt['duree']} mois",
-                        f"{alt['mensualite']:,.0f} €",
-                        f"{alt['cout_total']:,.0f} €",
-                        f"{alt['taux_effort']}%"
-                    ])
-                
-                opt_table = Table(opt_data, colWidths=[120, 80, 80, 100, 80])
-                opt_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-                ]))
-                
-                story.append(opt_table)
+            opt_data = [["Apport", "Durée", "Mensualité", "Coût total", "Taux d'effort"]]
             
-            # Générer le PDF
-            doc.build(story)
+            for alt in data["alternatives"][:5]:
+                opt_data.append([
+                    f"{alt['apport']:,.0f} € ({alt['apport_pct']}%)",
+                    f"{alt['duree']} mois",
+                    f"{alt['mensualite']:,.0f} €",
+                    f"{alt['cout_total']:,.0f} €",
+                    f"{alt['taux_effort']}%"
+                ])
             
-            # Retourner le fichier
-            return FileResponse(
-                tmp_file.name,
-                media_type='application/pdf',
-                filename=f"simulation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            )
+            opt_table = Table(opt_data, colWidths=[120, 80, 80, 100, 80])
+            opt_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+            ]))
             
+            story.append(opt_table)
+        
+        # Générer le PDF
+        if progress:
+            progress(0.1)
+        doc.build(story)
+    
+    return tmp_file.name
+
+@app.post("/export/pdf")
+async def export_pdf(data: dict):
+    """Export PDF du rapport - Coût: 1 crédit"""
+    try:
+        pdf_path = build_pdf_report(data)
+        
+        # Retourner le fichier
+        return FileResponse(
+            pdf_path,
+            media_type='application/pdf',
+            filename=f"simulation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        )
+        
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération du PDF: {str(e)}")
 
@@ -699,4 +1341,66 @@ async def list_scenarios():
     return {
         "scenarios": [],
         "message": "Les scénarios sont stockés localement dans votre navigateur"
-    }
\ No newline at end of file
+    }
+
+# Travaux asynchrones : les calculs lourds et les exports passent par la file locale
+job_manager.register("optimization", run_optimization, credits=3, model=OptimizationRequest)
+job_manager.register("investment", lambda data, progress: run_investment(data), credits=3, model=InvestmentRequest)
+job_manager.register("variable_rate", lambda data, progress: run_variable_rate(data), credits=2, model=VariableRateRequest)
+job_manager.register("multi_offer", lambda data, progress: run_multi_offer(data), credits=2, model=MultiOfferRequest)
+job_manager.register("pdf_export", lambda payload, progress: {"file": build_pdf_report(payload, progress)}, credits=1)
+
+@app.post("/jobs")
+async def submit_job(data: JobSubmitRequest):
+    """Soumettre un calcul lourd ou un export ; renvoie immédiatement un identifiant"""
+    try:
+        job, deduplicated = job_manager.submit(data.kind, data.payload)
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="File de travaux pleine, réessayez plus tard", headers={"Retry-After": "30"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "deduplicated": deduplicated
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Travail introuvable ou expiré")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Résultat d'un travail terminé (fichier pour les exports PDF)"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Travail introuvable ou expiré")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Travail non terminé ({job['status']})")
+    
+    if job["kind"] == "pdf_export":
+        return FileResponse(
+            job["result"]["file"],
+            media_type='application/pdf',
+            filename=f"simulation_{job_id}.pdf"
+        )
+    return job["result"]
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """Flux SSE de la progression d'un travail jusqu'à sa fin"""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Travail introuvable ou expiré")
+    
+    async def events():
+        async for job in job_manager.watch(job_id):
+            if job is None:
+                yield ": ping\n\n"
+            else:
+                yield f"event: {job['status']}\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -0,0 +1,126 @@
+"""Simulation d'un portefeuille locatif, vectorisée sur l'ensemble des biens.
+
+Les flux mensuels de tous les biens sont construits d'un bloc dans une
+matrice (biens x mois) : loyers indexés chaque année et minorés de la
+vacance, charges en croissance, mensualités et intérêts du prêt, impôt sur
+le résultat positif, puis revente nette du capital restant dû à
+l'horizon. Le TRI et la VAN sont résolus pour chaque bien et pour le
+portefeuille entier avec ``loan_math.solve_irr``.
+"""
+import json
+from typing import Dict, Iterator
+
+import numpy as np
+
+from loan_math import annuity_factor, solve_irr
+
+PROPERTY_FIELDS = (
+    "prix_bien", "apport", "taux", "duree", "loyer_mensuel", "charges_mensuelles",
+    "indexation_loyer", "vacance", "croissance_charges", "taux_imposition",
+    "revalorisation", "frais_revente", "frais_acquisition",
+)
+
+
+def simulate_portfolio(properties: Dict[str, np.ndarray], horizon_annees: int, taux_actualisation: float) -> dict:
+    """``properties`` : un tableau par champ de PROPERTY_FIELDS (taux et pourcentages en %)."""
+    p = {field: np.asarray(properties[field], dtype=np.float64)[:, None] for field in PROPERTY_FIELDS}
+    n_mois = horizon_annees * 12
+    mois = np.arange(1, n_mois + 1, dtype=np.float64)[None, :]
+    annee = np.floor((mois - 1) / 12)
+
+    # Prêt : mensualité constante jusqu'à la fin du prêt, capital restant en forme fermée
+    montant = p["prix_bien"] - p["apport"]
+    r = p["taux"] / 100 / 12
+    duree = p["duree"]
+    mensualite = montant * annuity_factor(r, duree)
+    en_cours = mois <= duree
+    growth = np.exp(np.minimum(mois, duree) * np.log1p(r))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        capital_restant = np.where(
+            r > 0,
+            montant * growth - mensualite * (growth - 1) / np.where(r > 0, r, 1),
+            montant - mensualite * np.minimum(mois, duree),
+        )
+    capital_restant = np.maximum(np.where(en_cours, capital_restant, 0.0), 0.0)
+    capital_debut = np.concatenate([montant, capital_restant[:, :-1]], axis=1)
+    interets = np.where(en_cours, capital_debut * r, 0.0)
+    remboursements = np.where(en_cours, mensualite, 0.0)
+
+    # Exploitation
+    loyers = p["loyer_mensuel"] * (1 + p["indexation_loyer"] / 100) ** annee * (1 - p["vacance"] / 100)
+    charges = p["charges_mensuelles"] * (1 + p["croissance_charges"] / 100) ** annee
+    impots = np.maximum(loyers - charges - interets, 0.0) * p["taux_imposition"] / 100
+
+    flux = loyers - charges - remboursements - impots
+
+    # Revente à l'horizon, nette des frais et du capital restant dû
+    valeur_revente = p["prix_bien"][:, 0] * (1 + p["revalorisation"][:, 0] / 100) ** horizon_annees
+    produit_revente = valeur_revente * (1 - p["frais_revente"][:, 0] / 100) - capital_restant[:, -1]
+    mise_initiale = p["apport"][:, 0] + p["prix_bien"][:, 0] * p["frais_acquisition"][:, 0] / 100
+
+    cash_flows = np.concatenate([-mise_initiale[:, None], flux], axis=1)
+    cash_flows[:, -1] += produit_revente
+
+    # TRI par bien et du portefeuille (somme des flux) en un seul appel du solveur
+    all_flows = np.vstack([cash_flows, cash_flows.sum(axis=0, keepdims=True)])
+    tri_mensuel = solve_irr(all_flows)
+    tri = np.expm1(12 * np.log1p(tri_mensuel)) * 100
+
+    q = (1 + taux_actualisation / 100) ** (1 / 12) - 1
+    actualisation = (1 + q) ** -np.arange(n_mois + 1, dtype=np.float64)
+    van = all_flows @ actualisation
+
+    return {
+        "n_biens": cash_flows.shape[0],
+        "horizon_annees": horizon_annees,
+        "mensualite": mensualite[:, 0],
+        "flux_annuels": flux.reshape(flux.shape[0], horizon_annees, 12).sum(axis=2),
+        "loyers_annuels": loyers.reshape(flux.shape[0], horizon_annees, 12).sum(axis=2),
+        "capital_restant_annuel": capital_restant[:, 11::12],
+        "valeur_revente": valeur_revente,
+        "produit_revente": produit_revente,
+        "mise_initiale": mise_initiale,
+        "tri": tri[:-1],
+        "van": van[:-1],
+        "tri_portefeuille": tri[-1],
+        "van_portefeuille": van[-1],
+    }
+
+
+def _clean(values):
+    return [round(v, 2) if np.isfinite(v) else None for v in np.asarray(values, dtype=np.float64).tolist()]
+
+
+def stream_portfolio(result: dict) -> Iterator[str]:
+    """Résultats en NDJSON : une ligne par année, puis une ligne de synthèse (TRI, VAN)."""
+    cumul = -result["mise_initiale"].sum()
+    for year in range(result["horizon_annees"]):
+        flux = result["flux_annuels"][:, year]
+        cumul += flux.sum()
+        yield json.dumps({
+            "type": "annee",
+            "annee": year + 1,
+            "flux_portefeuille": round(float(flux.sum()), 2),
+            "flux_cumule": round(float(cumul), 2),
+            "loyers_portefeuille": round(float(result["loyers_annuels"][:, year].sum()), 2),
+            "capital_restant_portefeuille": round(float(result["capital_restant_annuel"][:, year].sum()), 2),
+            "flux_par_bien": _clean(flux),
+        }) + "\n"
+
+    def single(value):
+        return round(float(value), 3) if np.isfinite(value) else None
+
+    yield json.dumps({
+        "type": "synthese",
+        "n_biens": result["n_biens"],
+        "tri_portefeuille": single(result["tri_portefeuille"]),
+        "van_portefeuille": single(result["van_portefeuille"]),
+        "produit_revente_portefeuille": round(float(result["produit_revente"].sum()), 2),
+        "biens": [
+            {"mensualite": m, "tri": single(t), "van": v, "produit_revente": pr}
+            for m, t, v, pr in zip(
+                _clean(result["mensualite"]), result["tri"].tolist(),
+                _clean(result["van"]), _clean(result["produit_revente"]),
+            )
+        ],
+    }) + "\n"
@@ -0,0 +1,265 @@
+"""Moteur d'alertes de taux côté serveur.
+
+Les abonnements sont rangés par (banque, durée) et par sens dans des listes
+triées par seuil. Quand une mise à jour des taux est validée, seuls les
+seuils compris entre l'ancien et le nouveau taux sont franchis : on les
+trouve par bissection et on les retire du bloc en une seule tranche, sans
+parcourir les autres abonnements.
+
+Les déclenchements sont poussés sur le flux ``/bank-rates/stream`` (événement
+``alert``) sous l'empreinte ``stream_key`` de l'abonnement : l'identifiant
+lui-même sert de clé d'accès et n'est jamais diffusé.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from database import SessionLocal, BankRate, RateAlertSubscription
+from rate_matrix import DURATIONS_YEARS
+
+logger = logging.getLogger(__name__)
+
+ALERT_DURATIONS = tuple(years * 12 for years in DURATIONS_YEARS)
+DIRECTIONS = ("below", "above")
+
+ANY_BANK = None
+
+RateKey = Tuple[str, int]  # (banque, durée en mois)
+
+
+class _Bucket:
+    """Seuils triés et identifiants alignés pour un (banque, durée, sens)."""
+
+    __slots__ = ("thresholds", "ids")
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.ids: List[str] = []
+
+    def add(self, threshold: float, sub_id: str):
+        i = bisect.bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(i, threshold)
+        self.ids.insert(i, sub_id)
+
+    def remove(self, threshold: float, sub_id: str) -> bool:
+        lo = bisect.bisect_left(self.thresholds, threshold)
+        hi = bisect.bisect_right(self.thresholds, threshold)
+        for i in range(lo, hi):
+            if self.ids[i] == sub_id:
+                del self.thresholds[i]
+                del self.ids[i]
+                return True
+        return False
+
+    def pop_range(self, lo: int, hi: int) -> List[str]:
+        popped = self.ids[lo:hi]
+        del self.thresholds[lo:hi]
+        del self.ids[lo:hi]
+        return popped
+
+
+class AlertIndex:
+    """Index des abonnements actifs ; un abonnement déclenché en sort (alerte à usage unique)."""
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[Optional[str], int, str], _Bucket] = {}
+        self._subscriptions: Dict[str, Tuple[Optional[str], int, str, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def add(self, sub_id: str, bank_name: Optional[str], duree: int, threshold: float, direction: str):
+        with self._lock:
+            self._bucket(bank_name, duree, direction).add(threshold, sub_id)
+            self._subscriptions[sub_id] = (bank_name, duree, direction, threshold)
+
+    def remove(self, sub_id: str) -> bool:
+        with self._lock:
+            sub = self._subscriptions.pop(sub_id, None)
+            if sub is None:
+                return False
+            bank_name, duree, direction, threshold = sub
+            return self._bucket(bank_name, duree, direction).remove(threshold, sub_id)
+
+    def bulk_load(self, subscriptions):
+        """Reconstruit l'index à partir de tuples (id, banque, durée, seuil, sens) : un tri par bloc."""
+        grouped: Dict[Tuple[Optional[str], int, str], List[Tuple[float, str]]] = {}
+        subs = {}
+        for sub_id, bank_name, duree, threshold, direction in subscriptions:
+            grouped.setdefault((bank_name, duree, direction), []).append((threshold, sub_id))
+            subs[sub_id] = (bank_name, duree, direction, threshold)
+
+        buckets = {}
+        for key, entries in grouped.items():
+            entries.sort()
+            bucket = _Bucket()
+            bucket.thresholds = [t for t, _ in entries]
+            bucket.ids = [i for _, i in entries]
+            buckets[key] = bucket
+
+        with self._lock:
+            self._buckets = buckets
+            self._subscriptions = subs
+
+    def match(self, old_rates: Dict[RateKey, float], new_rates: Dict[RateKey, float]) -> List[dict]:
+        """Abonnements dont le seuil a été franchi entre old_rates et new_rates.
+
+        ``below`` se déclenche quand le taux passe à un niveau <= seuil
+        (seuils dans [nouveau, ancien[), ``above`` quand il passe à un niveau
+        >= seuil (seuils dans ]ancien, nouveau]). Une banque absente de
+        old_rates est traitée comme partant de l'infini dans le sens défavorable.
+        """
+        triggered = []
+        with self._lock:
+            for (bank_name, duree), new in new_rates.items():
+                old = old_rates.get((bank_name, duree))
+                if old == new:
+                    continue
+
+                for key_bank in (bank_name, ANY_BANK):
+                    if old is None or new < old:
+                        bucket = self._buckets.get((key_bank, duree, "below"))
+                        if bucket:
+                            lo = bisect.bisect_left(bucket.thresholds, new)
+                            hi = len(bucket.thresholds) if old is None else bisect.bisect_left(bucket.thresholds, old)
+                            fired = bucket.pop_range(lo, hi)
+                            triggered.extend(self._fire(fired, bank_name, duree, old, new))
+                    if old is None or new > old:
+                        bucket = self._buckets.get((key_bank, duree, "above"))
+                        if bucket:
+                            lo = 0 if old is None else bisect.bisect_right(bucket.thresholds, old)
+                            hi = bisect.bisect_right(bucket.thresholds, new)
+                            fired = bucket.pop_range(lo, hi)
+                            triggered.extend(self._fire(fired, bank_name, duree, old, new))
+        return triggered
+
+    def _fire(self, sub_ids, bank_name, duree, old, new):
+        for sub_id in sub_ids:
+            subscription_bank, _, direction, threshold = self._subscriptions.pop(sub_id)
+            yield {
+                "id": sub_id,
+                "subscription_bank": subscription_bank,
+                "bank_name": bank_name,
+                "duree": duree,
+                "direction": direction,
+                "threshold": threshold,
+                "old_rate": old,
+                "new_rate": new,
+            }
+
+    def restore(self, triggered: List[dict]):
+        """Remet dans l'index des abonnements sortis par ``match`` (déclenchement non enregistré)."""
+        for t in triggered:
+            self.add(t["id"], t["subscription_bank"], t["duree"], t["threshold"], t["direction"])
+
+    def _bucket(self, bank_name, duree, direction) -> _Bucket:
+        key = (bank_name, duree, direction)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket()
+        return bucket
+
+
+alert_index = AlertIndex()
+
+
+def stream_key(sub_id: str) -> str:
+    """Empreinte publique d'un abonnement, seule référence diffusée sur le flux SSE."""
+    return hashlib.sha256(sub_id.encode()).hexdigest()[:32]
+
+
+def alert_events(triggered: List[dict]) -> List[dict]:
+    """Déclenchements tels que poussés aux clients (sans l'identifiant de l'abonnement)."""
+    return [
+        {
+            "stream_key": stream_key(t["id"]),
+            **{k: t[k] for k in ("bank_name", "duree", "direction", "threshold", "old_rate", "new_rate")},
+        }
+        for t in triggered
+    ]
+
+
+def snapshot_rates(db) -> Dict[RateKey, float]:
+    """Taux actuels par (banque, durée en mois), pour comparer avant/après une mise à jour."""
+    rates = {}
+    for row in db.query(BankRate).all():
+        for years in DURATIONS_YEARS:
+            rate = getattr(row, f"rate_{years}_years")
+            if rate:
+                rates[(row.bank_name, years * 12)] = rate
+    return rates
+
+
+def load_alert_index(db=None):
+    """Charge les abonnements non déclenchés dans l'index (au démarrage)."""
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        rows = db.query(
+            RateAlertSubscription.id,
+            RateAlertSubscription.bank_name,
+            RateAlertSubscription.duree,
+            RateAlertSubscription.threshold,
+            RateAlertSubscription.direction,
+        ).filter(RateAlertSubscription.triggered_at.is_(None))
+        alert_index.bulk_load(rows)
+    finally:
+        if own_session:
+            db.close()
+
+
+def create_subscription(db, bank_name: Optional[str], duree: int, threshold: float,
+                        direction: str) -> RateAlertSubscription:
+    sub = RateAlertSubscription(
+        id=uuid.uuid4().hex,
+        bank_name=bank_name,
+        duree=duree,
+        threshold=threshold,
+        direction=direction,
+        created_at=datetime.utcnow(),
+    )
+    db.add(sub)
+    db.commit()
+    alert_index.add(sub.id, bank_name, duree, threshold, direction)
+    return sub
+
+
+def delete_subscription(db, sub_id: str) -> bool:
+    deleted = db.query(RateAlertSubscription).filter(RateAlertSubscription.id == sub_id).delete()
+    db.commit()
+    alert_index.remove(sub_id)
+    return bool(deleted)
+
+
+def process_rate_changes(db, old_rates: Dict[RateKey, float], new_rates: Dict[RateKey, float]) -> List[dict]:
+    """Déclenche les alertes franchies et enregistre le déclenchement en base.
+
+    Si l'enregistrement échoue, les abonnements retournent dans l'index
+    (ils restent actifs, comme en base) et aucun déclenchement n'est renvoyé.
+    """
+    triggered = alert_index.match(old_rates, new_rates)
+    if triggered:
+        now = datetime.utcnow()
+        try:
+            db.bulk_update_mappings(RateAlertSubscription, [
+                {
+                    "id": t["id"],
+                    "triggered_at": now,
+                    "triggered_bank": t["bank_name"],
+                    "triggered_rate": t["new_rate"],
+                }
+                for t in triggered
+            ])
+            db.commit()
+        except Exception as e:
+            logger.error(f"Error recording {len(triggered)} triggered alerts: {e}")
+            db.rollback()
+            alert_index.restore(triggered)
+            return []
+    return triggered
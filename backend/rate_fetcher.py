@@ -5,6 +5,9 @@ import asyncio
 import json
 from typing import Dict, List, Optional
 from database import SessionLocal, BankRate
+from rate_matrix import refresh_rate_matrix
+from rate_alerts import snapshot_rates, process_rate_changes, alert_events
+from rate_stream import broadcaster, rate_deltas
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -204,6 +207,8 @@ class RateFetcher:
         db = SessionLocal()
         
         try:
+            old_rates = snapshot_rates(db)
+            
             for bank_name, bank_rates in rates.items():
                 # Check if bank exists
                 existing = db.query(BankRate).filter(BankRate.bank_name == bank_name).first()
@@ -229,6 +234,23 @@ class RateFetcher:
             
             db.commit()
             logger.info(f"Successfully updated {len(rates)} bank rates")
+            refresh_rate_matrix(db)
+            
+            new_rates = snapshot_rates(db)
+            triggered = process_rate_changes(db, old_rates, new_rates)
+            if triggered:
+                logger.info(f"{len(triggered)} rate alerts triggered")
+            
+            # Only the banks whose rates moved are pushed to SSE clients
+            deltas = rate_deltas(old_rates, new_rates)
+            if deltas:
+                broadcaster.publish("delta", {
+                    "changed": deltas,
+                    "last_update": datetime.utcnow().strftime("%Y-%m-%d %H:%M")
+                })
+            # Alerts are pushed on the same stream, after the rates that fired them
+            if triggered:
+                broadcaster.publish("alert", {"triggered": alert_events(triggered)})
             
         except Exception as e:
             logger.error(f"Error updating database: {e}")
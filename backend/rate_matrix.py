@@ -0,0 +1,108 @@
+"""Matrice des taux bancaires précalculée pour la recherche de meilleures offres.
+
+La matrice (banques x durées) et les facteurs d'annuité associés sont
+recalculés à chaque mise à jour des taux ; une requête ne fait plus qu'un
+produit vectorisé et une sélection top-k.
+"""
+import heapq
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from database import SessionLocal, BankRate
+from loan_math import annuity_factor
+
+DURATIONS_YEARS = (10, 15, 20, 25, 30)
+
+
+class RateMatrix:
+    """Instantané immuable des taux ; remplacé en bloc lors d'un refresh."""
+
+    def __init__(self, bank_names: List[str], is_promotional: List[bool], rates: np.ndarray,
+                 built_at: Optional[datetime] = None):
+        self.bank_names = bank_names
+        self.is_promotional = is_promotional
+        self.rates = rates  # % annuel, NaN si la durée n'est pas proposée
+        self.durations = np.array(DURATIONS_YEARS) * 12
+        self.built_at = built_at or datetime.utcnow()
+
+        # Mensualité et coût total pour 1 € emprunté, par (banque, durée)
+        valid = ~np.isnan(rates)
+        self.factors = np.where(valid, annuity_factor(np.nan_to_num(rates) / 100 / 12, self.durations), np.nan)
+        self.total_factors = self.factors * self.durations
+
+    @classmethod
+    def from_rows(cls, rows: List[BankRate]) -> "RateMatrix":
+        rates = np.array(
+            [[getattr(row, f"rate_{years}_years") for years in DURATIONS_YEARS] for row in rows],
+            dtype=np.float64,
+        ).reshape(len(rows), len(DURATIONS_YEARS))
+        # Un taux nul ou absent signifie "non communiqué" côté fetcher
+        rates[~(rates > 0)] = np.nan
+        return cls(
+            [row.bank_name for row in rows],
+            [bool(row.is_promotional) for row in rows],
+            rates,
+        )
+
+    def best_offers(self, montant: float, mensualite_max: float, top_k: int = 5,
+                    critere: str = "cout_total", affordable_only: bool = True) -> dict:
+        """Classe toutes les combinaisons banque x durée pour un montant donné."""
+        mensualites = montant * self.factors
+        couts = montant * self.total_factors
+        abordable = mensualites <= mensualite_max
+
+        score = couts if critere == "cout_total" else mensualites
+        mask = ~np.isnan(score)
+        if affordable_only:
+            mask &= abordable
+
+        flat_idx = np.flatnonzero(mask)
+        flat_score = score.ravel()
+        best = heapq.nsmallest(top_k, flat_idx.tolist(), key=flat_score.__getitem__)
+
+        offers = []
+        n_durations = len(DURATIONS_YEARS)
+        for idx in best:
+            i, j = divmod(idx, n_durations)
+            mensualite = float(mensualites[i, j])
+            cout_total = float(couts[i, j])
+            offers.append({
+                "bank_name": self.bank_names[i],
+                "is_promotional": self.is_promotional[i],
+                "taux": float(self.rates[i, j]),
+                "duree": int(self.durations[j]),
+                "mensualite": round(mensualite, 2),
+                "cout_total": round(cout_total, 2),
+                "cout_credit": round(cout_total - montant, 2),
+                "abordable": bool(abordable[i, j]),
+            })
+
+        return {
+            "offers": offers,
+            "nb_combinaisons": int(np.count_nonzero(~np.isnan(score))),
+            "nb_abordables": int(np.count_nonzero(abordable & ~np.isnan(score))),
+        }
+
+
+_current = RateMatrix([], [], np.empty((0, len(DURATIONS_YEARS))))
+
+
+def get_rate_matrix() -> RateMatrix:
+    return _current
+
+
+def refresh_rate_matrix(db=None) -> RateMatrix:
+    """Reconstruit la matrice depuis la table bank_rates (appelé après chaque commit)."""
+    global _current
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        matrix = RateMatrix.from_rows(db.query(BankRate).all())
+    finally:
+        if own_session:
+            db.close()
+    _current = matrix
+    return matrix
@@ -0,0 +1,139 @@
+"""Diffusion des mises à jour de taux en Server-Sent Events.
+
+Chaque mise à jour validée produit un seul événement ``delta`` (banques
+dont au moins un taux a changé), suivi d'un événement ``alert`` si des
+alertes de taux se sont déclenchées ; chaque événement est formaté une fois
+puis déposé dans la file bornée de chaque client connecté. Un client trop lent pour sa file est
+déconnecté ; il se reconnecte avec ``Last-Event-ID`` et rejoue les
+événements manqués depuis l'historique, ou reçoit un ``reset`` suivi
+d'un ``snapshot`` complet si l'historique ne remonte plus assez loin. Un
+seul minuteur global envoie les heartbeats, quel que soit le nombre de
+connexions inactives.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+CLIENT_BUFFER_SIZE = 32
+HISTORY_SIZE = 256
+HEARTBEAT_SECONDS = 15
+
+_HEARTBEAT = ": ping\n\n"
+_CLOSE = None
+
+
+def format_event(event_id: str, event: str, data: dict) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class RateBroadcaster:
+    def __init__(self, buffer_size: int = CLIENT_BUFFER_SIZE, history_size: int = HISTORY_SIZE,
+                 heartbeat_seconds: float = HEARTBEAT_SECONDS):
+        self.buffer_size = buffer_size
+        self.heartbeat_seconds = heartbeat_seconds
+        # Les identifiants portent l'époque du process : un Last-Event-ID d'un
+        # autre démarrage ne peut pas être rejoué
+        self.epoch = str(int(time.time()))
+        self.seq = 0
+        self.history: deque = deque(maxlen=history_size)
+        self.clients: Set[asyncio.Queue] = set()
+        self.dropped_clients = 0
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    @property
+    def last_event_id(self) -> str:
+        return f"{self.epoch}-{self.seq}"
+
+    def publish(self, event: str, data: dict) -> str:
+        self.seq += 1
+        message = format_event(self.last_event_id, event, data)
+        self.history.append((self.seq, message))
+        for queue in list(self.clients):
+            self._offer(queue, message)
+        return self.last_event_id
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[asyncio.Queue, Optional[List[str]]]:
+        """Nouvelle file client et événements manqués à renvoyer avant elle.
+
+        Les événements manqués valent None à la première connexion ou si
+        l'historique ne remonte plus assez loin : l'appelant envoie alors
+        ``reset`` puis un ``snapshot`` complet.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_size)
+        backlog = self.replay(last_event_id) if last_event_id else None
+        self.clients.add(queue)
+        self._ensure_heartbeat()
+        return queue, backlog
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.clients.discard(queue)
+
+    def replay(self, last_event_id: str) -> Optional[List[str]]:
+        """Événements publiés après ``last_event_id``, ou None si l'historique ne remonte plus assez loin."""
+        epoch, _, seq = last_event_id.partition("-")
+        oldest = self.history[0][0] if self.history else self.seq + 1
+        if epoch != self.epoch or not seq.isdigit() or int(seq) + 1 < oldest:
+            return None
+        return [message for event_seq, message in self.history if event_seq > int(seq)]
+
+    def reset_event(self) -> str:
+        return format_event(self.last_event_id, "reset", {"reason": "history_unavailable"})
+
+    def _offer(self, queue: asyncio.Queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Client trop lent : on vide sa file (rien n'est sauté) et on le coupe ; il
+            # reprendra via Last-Event-ID depuis le dernier événement effectivement reçu
+            self.clients.discard(queue)
+            self.dropped_clients += 1
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_CLOSE)
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def _heartbeat_loop(self):
+        while self.clients:
+            await asyncio.sleep(self.heartbeat_seconds)
+            for queue in list(self.clients):
+                if queue.empty():
+                    self._offer(queue, _HEARTBEAT)
+
+    async def stream(self, queue: asyncio.Queue, initial: Optional[str] = None):
+        """Générateur SSE pour une connexion ; se termine sur _CLOSE ou à la déconnexion."""
+        try:
+            yield "retry: 5000\n\n"
+            if initial:
+                yield initial
+            while True:
+                message = await queue.get()
+                if message is _CLOSE:
+                    break
+                yield message
+        finally:
+            self.unsubscribe(queue)
+
+
+def rate_deltas(old_rates: Dict, new_rates: Dict) -> List[dict]:
+    """Banques dont au moins un taux a changé, avec tous leurs taux actuels."""
+    changed_banks = {
+        bank for (bank, duree), rate in new_rates.items() if old_rates.get((bank, duree)) != rate
+    } | {
+        bank for (bank, duree) in old_rates if (bank, duree) not in new_rates
+    }
+    deltas = []
+    for bank in sorted(changed_banks):
+        row = {"bank_name": bank}
+        for (rate_bank, duree), rate in new_rates.items():
+            if rate_bank == bank:
+                row[f"rate_{duree // 12}_years"] = rate
+        deltas.append(row)
+    return deltas
+
+
+broadcaster = RateBroadcaster()
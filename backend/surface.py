@@ -0,0 +1,71 @@
+"""Surfaces de mensualité et de coût sur une grille 2-D, en un seul passage numpy.
+
+Deux grilles sont proposées :
+- ``taux_duree`` : taux annuel (%) en lignes x durée (mois) en colonnes,
+  pour un montant emprunté fixe ;
+- ``prix_apport`` : prix du bien en lignes x apport en colonnes, pour un
+  taux et une durée fixes.
+
+Chaque surface est accompagnée des sensibilités analytiques de la
+mensualité : variation pour +0,1 % de taux et pour +12 mois de durée.
+"""
+import numpy as np
+
+from loan_math import annuity_factor, payment_sensitivities
+
+SURFACE_FIELDS = ("mensualite", "cout_total", "cout_credit", "delta_taux_0_1", "delta_duree_12")
+MAX_SURFACE_CELLS = 250_000
+
+# Pas utilisés pour exprimer les dérivées en unités lisibles
+TAUX_STEP_PCT = 0.1
+DUREE_STEP_MONTHS = 12
+
+
+def axis_count(start: float, stop: float, step: float) -> int:
+    """Nombre de valeurs de start à stop inclus, par pas de step (sans rien allouer)."""
+    if not all(np.isfinite((start, stop, step))):
+        raise ValueError("les bornes et le pas doivent être finis")
+    if step <= 0:
+        raise ValueError("le pas doit être strictement positif")
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if count < 1:
+        raise ValueError("la borne max doit être supérieure ou égale à la borne min")
+    return count
+
+
+def axis(start: float, step: float, count: int) -> np.ndarray:
+    """Valeurs start, start + step, ... (count valeurs) ; count vient de axis_count."""
+    return start + step * np.arange(count, dtype=np.float64)
+
+
+def compute_surface(montant, taux_pct, duree) -> dict:
+    """Calcule tous les champs de SURFACE_FIELDS sur des grilles déjà broadcastées."""
+    montant, taux_pct, duree = np.broadcast_arrays(
+        np.asarray(montant, dtype=np.float64),
+        np.asarray(taux_pct, dtype=np.float64),
+        np.asarray(duree, dtype=np.float64),
+    )
+    taux_mensuel = taux_pct / 100 / 12
+    mensualite = montant * annuity_factor(taux_mensuel, duree)
+    cout_total = mensualite * duree
+    d_taux, d_duree = payment_sensitivities(montant, taux_mensuel, duree)
+
+    return {
+        "mensualite": mensualite,
+        "cout_total": cout_total,
+        "cout_credit": cout_total - montant,
+        # dM/dr est exprimé par unité de taux mensuel : +0,1 % annuel = 0,1 / 1200
+        "delta_taux_0_1": d_taux * TAUX_STEP_PCT / 100 / 12,
+        "delta_duree_12": d_duree * DUREE_STEP_MONTHS,
+    }
+
+
+def taux_duree_surface(montant, taux_values, duree_values) -> dict:
+    return compute_surface(montant, taux_values[:, None], duree_values[None, :])
+
+
+def prix_apport_surface(taux, duree, prix_values, apport_values) -> dict:
+    montant = prix_values[:, None] - apport_values[None, :]
+    # Apport supérieur au prix : rien à emprunter, cellule vide
+    montant = np.where(montant > 0, montant, np.nan)
+    return compute_surface(montant, taux, duree)
@@ -0,0 +1,49 @@
+"""Calcul du TAEG (taux annuel effectif global) pour des lots d'offres.
+
+Le TAEG est le taux actuariel annuel qui égalise le capital réellement
+perçu (montant emprunté moins les frais de dossier) et la suite des
+mensualités assurance comprise. Il n'a pas de forme fermée : on résout le
+taux mensuel équivalent avec ``loan_math.solve_monthly_rate`` sur tout le
+lot en une fois.
+"""
+import numpy as np
+
+from loan_math import annuity_factor, solve_monthly_rate
+
+TAEG_TOL = 1e-12
+TAEG_MAX_ITER = 60
+
+
+def insurance_monthly(montant, taux_assurance, assurance_mensuelle):
+    """Assurance mensuelle : taux annuel sur capital initial si fourni, sinon montant fixe."""
+    montant = np.asarray(montant, dtype=np.float64)
+    taux_assurance = np.asarray(taux_assurance, dtype=np.float64)
+    return np.where(
+        taux_assurance > 0,
+        montant * taux_assurance / 100 / 12,
+        np.asarray(assurance_mensuelle, dtype=np.float64),
+    )
+
+
+def compute_taeg(montant, taux, duree, frais_dossier=0.0, assurance_mensuelle=0.0, taux_assurance=0.0,
+                 tol=TAEG_TOL, max_iter=TAEG_MAX_ITER):
+    """TAEG (en %) d'un lot d'offres ; tous les arguments sont broadcastés.
+
+    Retourne un dict de tableaux : taeg, mensualite_totale, converged, et le
+    nombre d'itérations effectuées. Les offres non convergées ont un TAEG NaN.
+    """
+    montant = np.asarray(montant, dtype=np.float64)
+    duree = np.asarray(duree, dtype=np.float64)
+    mensualite_credit = montant * annuity_factor(np.asarray(taux, dtype=np.float64) / 100 / 12, duree)
+    mensualite_totale = mensualite_credit + insurance_monthly(montant, taux_assurance, assurance_mensuelle)
+    capital_net = montant - np.asarray(frais_dossier, dtype=np.float64)
+
+    q, converged, iterations = solve_monthly_rate(capital_net, mensualite_totale, duree, tol=tol, max_iter=max_iter)
+    taeg = np.where(converged, np.expm1(12 * np.log1p(q)) * 100, np.nan)
+
+    return {
+        "taeg": taeg,
+        "mensualite_totale": mensualite_totale,
+        "converged": converged,
+        "iterations": iterations,
+    }
@@ -0,0 +1,303 @@
+"""Sessions "what-if" incrémentales pour les pages Optimisation, Taux variable et Investissement.
+
+Le client ouvre une session avec un scénario complet puis envoie de petits
+correctifs (un curseur bouge). Chaque modèle est décrit comme un graphe de
+nœuds dont on connaît les dépendances : un correctif n'invalide que les
+nœuds qui dépendent, directement ou non, des champs modifiés, et les
+valeurs intermédiaires (facteurs d'annuité, tableaux d'amortissement) sont
+réutilisées. Les calculs reprennent ceux des endpoints correspondants.
+
+Les sessions sont gardées en LRU, bornées en nombre et en mémoire.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from loan_math import annuity_factor
+
+MAX_SESSIONS = 2000
+MAX_SESSION_BYTES = 64 * 1024 * 1024
+
+
+class WhatIfModel:
+    def __init__(self, name: str, request_model, output: str = "result"):
+        self.name = name
+        self.request_model = request_model
+        self.output = output
+        self.nodes: Dict[str, Tuple[Tuple[str, ...], Callable]] = {}
+
+    def node(self, *deps: str):
+        """Déclare un nœud ; ses dépendances sont des paramètres ou d'autres nœuds."""
+        def register(fn):
+            self.nodes[fn.__name__] = (deps, fn)
+            return fn
+        return register
+
+    def dependents(self, changed) -> set:
+        """Nœuds à recalculer quand les champs ``changed`` sont modifiés."""
+        dirty = set()
+        frontier = set(changed)
+        while frontier:
+            frontier = {
+                name for name, (deps, _) in self.nodes.items()
+                if name not in dirty and frontier.intersection(deps)
+            }
+            dirty |= frontier
+        return dirty
+
+
+class WhatIfSession:
+    def __init__(self, model: WhatIfModel, params: dict):
+        self.id = uuid.uuid4().hex
+        self.model = model
+        self.params = params
+        self.cache: Dict[str, object] = {}
+        self.lock = threading.Lock()
+
+    def evaluate(self, name: str, recomputed: List[str]):
+        if name in self.params:
+            return self.params[name]
+        if name not in self.cache:
+            deps, fn = self.model.nodes[name]
+            self.cache[name] = fn(*(self.evaluate(dep, recomputed) for dep in deps))
+            recomputed.append(name)
+        return self.cache[name]
+
+    def result(self) -> Tuple[dict, List[str]]:
+        recomputed: List[str] = []
+        return self.evaluate(self.model.output, recomputed), recomputed
+
+    def patch(self, changes: dict) -> Tuple[dict, List[str]]:
+        merged = {**self.params, **changes}
+        # Validation sur le scénario complet : un correctif ne peut pas casser le modèle
+        merged = self.model.request_model(**merged).model_dump()
+        changed = {key for key, value in merged.items() if self.params.get(key) != value}
+        self.params = merged
+        for name in self.model.dependents(changed):
+            self.cache.pop(name, None)
+        return self.result()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(value.nbytes for value in self.cache.values() if isinstance(value, np.ndarray))
+
+
+class SessionStore:
+    """LRU des sessions, borné en nombre de sessions et en octets de tableaux mis en cache."""
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, max_bytes: int = MAX_SESSION_BYTES):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, WhatIfSession]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._bytes.values())
+
+    def add(self, session: WhatIfSession):
+        with self._lock:
+            self._sessions[session.id] = session
+            self._bytes[session.id] = session.nbytes
+            self._evict()
+
+    def get(self, session_id: str) -> Optional[WhatIfSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def touch(self, session: WhatIfSession):
+        """Met à jour l'empreinte mémoire après un recalcul."""
+        with self._lock:
+            if session.id in self._sessions:
+                self._bytes[session.id] = session.nbytes
+                self._evict()
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            self._bytes.pop(session_id, None)
+            return self._sessions.pop(session_id, None) is not None
+
+    def _evict(self):
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+        ):
+            session_id, _ = self._sessions.popitem(last=False)
+            self._bytes.pop(session_id, None)
+            self.evicted += 1
+
+
+MODELS: Dict[str, WhatIfModel] = {}
+
+
+def register_model(model: WhatIfModel) -> WhatIfModel:
+    MODELS[model.name] = model
+    return model
+
+
+def build_models(OptimizationRequest, VariableRateRequest, InvestmentRequest):
+    """Construit les graphes à partir des modèles de requête des endpoints (définis dans main)."""
+
+    # --- Optimisation apport/durée (même grille et mêmes règles que optimize_loan) ---
+    opt = register_model(WhatIfModel("optimization", OptimizationRequest))
+
+    @opt.node("duree_min", "duree_max")
+    def durees(duree_min, duree_max):
+        return np.arange(duree_min, duree_max + 1, 12, dtype=np.float64)
+
+    @opt.node("taux", "durees")
+    def facteurs(taux, durees):
+        return annuity_factor(taux / 12, durees)
+
+    @opt.node("prix_bien")
+    def apports(prix_bien):
+        return prix_bien * np.arange(0, 31, 5, dtype=np.float64) / 100
+
+    @opt.node("prix_bien", "apports", "facteurs", "durees")
+    def grille(prix_bien, apports, facteurs, durees):
+        # Lignes : durées, colonnes : pourcentages d'apport (ordre des boucles de l'endpoint)
+        mensualites = (prix_bien - apports)[None, :] * facteurs[:, None]
+        cout_total = mensualites * durees[:, None] + apports[None, :]
+        return np.stack([mensualites, cout_total])
+
+    @opt.node("grille", "salaire", "charges", "durees", "apports", "prix_bien")
+    def result(grille, salaire, charges, durees, apports, prix_bien):
+        mensualites, cout_total = grille
+        taux_effort = mensualites / (salaire - charges)
+        viable = np.flatnonzero((taux_effort <= 0.33).ravel())
+        order = viable[np.argsort(cout_total.ravel()[viable], kind="stable")][:5]
+
+        alternatives = []
+        for idx in order.tolist():
+            i, j = divmod(idx, len(apports))
+            alternatives.append({
+                "duree": int(durees[i]),
+                "apport": round(float(apports[j]), 2),
+                "apport_pct": j * 5,
+                "mensualite": round(float(mensualites[i, j]), 2),
+                "cout_total": round(float(cout_total[i, j]), 2),
+                "cout_credit": round(float(mensualites[i, j] * durees[i] - (prix_bien - apports[j])), 2),
+                "taux_effort": round(float(taux_effort[i, j]) * 100, 1),
+            })
+        return {
+            "optimal": alternatives[0] if alternatives else None,
+            "alternatives": alternatives,
+            "credits_required": 3,
+        }
+
+    # --- Taux variable (mêmes projections que calculate_variable_rate) ---
+    var = register_model(WhatIfModel("variable_rate", VariableRateRequest))
+
+    @var.node("salaire", "charges")
+    def mensualite_max(salaire, charges):
+        return salaire * 0.33 - charges
+
+    @var.node("taux_initial", "periode_fixe")
+    def facteur_fixe(taux_initial, periode_fixe):
+        return 1 / annuity_factor(taux_initial / 12, periode_fixe)
+
+    @var.node("mensualite_max", "facteur_fixe")
+    def montant_fixe(mensualite_max, facteur_fixe):
+        return mensualite_max * float(facteur_fixe)
+
+    @var.node("taux_initial", "variation_annuelle", "duree")
+    def taux_annuels(taux_initial, variation_annuelle, duree):
+        return taux_initial + variation_annuelle * np.arange(duree // 12, dtype=np.float64)
+
+    @var.node("taux_annuels", "duree")
+    def facteurs_annuels(taux_annuels, duree):
+        mois_restants = duree - 12 * np.arange(len(taux_annuels), dtype=np.float64)
+        return annuity_factor(taux_annuels / 12, mois_restants)
+
+    @var.node("montant_fixe", "mensualite_max", "taux_annuels", "facteurs_annuels", "duree")
+    def result(montant_fixe, mensualite_max, taux_annuels, facteurs_annuels, duree):
+        annees = np.arange(len(taux_annuels))
+        capital_restant = montant_fixe * (1 - annees * 12 / duree)
+        mensualites = capital_restant * facteurs_annuels
+        return {
+            "montant_initial": round(montant_fixe, 2),
+            "mensualite_initiale": round(mensualite_max, 2),
+            "projections": [
+                {
+                    "annee": annee + 1,
+                    "taux": round(taux, 3),
+                    "mensualite": round(mensualite, 2),
+                    "capital_restant": round(capital, 2),
+                }
+                for annee, taux, mensualite, capital in zip(
+                    annees.tolist(), taux_annuels.tolist(), mensualites.tolist(), capital_restant.tolist()
+                )
+            ],
+            "credits_required": 2,
+        }
+
+    # --- Investissement locatif (mêmes sorties que calculate_investment) ---
+    inv = register_model(WhatIfModel("investment", InvestmentRequest))
+
+    @inv.node("prix_bien", "apport")
+    def montant_emprunte(prix_bien, apport):
+        return prix_bien - apport
+
+    @inv.node("taux", "duree")
+    def amortissement(taux, duree):
+        # Ratio capital_rembourse / montant de calculate_investment après m mois, m = 0..duree
+        r = taux / 12
+        mois = np.arange(duree + 1, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.expm1((mois - duree) * np.log1p(r)) / np.expm1(-duree * np.log1p(r))
+        return fraction if r != 0 else mois / duree
+
+    @inv.node("taux", "duree")
+    def facteur(taux, duree):
+        return float(annuity_factor(taux / 12, duree))
+
+    @inv.node("montant_emprunte", "facteur")
+    def mensualite(montant_emprunte, facteur):
+        return montant_emprunte * facteur
+
+    @inv.node("loyer_mensuel", "mensualite", "charges_mensuelles")
+    def cash_flow_mensuel(loyer_mensuel, mensualite, charges_mensuelles):
+        return loyer_mensuel - mensualite - charges_mensuelles
+
+    @inv.node("loyer_mensuel", "charges_mensuelles", "impots_annuels", "prix_bien")
+    def rendements(loyer_mensuel, charges_mensuelles, impots_annuels, prix_bien):
+        brut = (loyer_mensuel * 12) / prix_bien * 100
+        net = ((loyer_mensuel * 12 - charges_mensuelles * 12 - impots_annuels) / prix_bien) * 100
+        return brut, net
+
+    @inv.node("montant_emprunte", "amortissement", "cash_flow_mensuel", "impots_annuels", "rendements",
+              "mensualite", "duree")
+    def result(montant_emprunte, amortissement, cash_flow_mensuel, impots_annuels, rendements,
+               mensualite, duree):
+        rendement_brut, rendement_net = rendements
+        projections = []
+        for annees in [5, 10, 15, 20]:
+            if annees * 12 <= duree:
+                mois = annees * 12
+                projections.append({
+                    "annees": annees,
+                    "cash_flow_cumule": round(cash_flow_mensuel * mois - impots_annuels * annees, 2),
+                    "capital_rembourse": round(montant_emprunte * float(amortissement[mois]), 2),
+                    "rendement_brut": round(rendement_brut, 2),
+                    "rendement_net": round(rendement_net, 2),
+                })
+        return {
+            "mensualite": round(mensualite, 2),
+            "cash_flow_mensuel": round(cash_flow_mensuel, 2),
+            "rentabilite_brute": round(rendement_brut, 2),
+            "projections": projections,
+            "credits_required": 3,
+        }
+
+
+session_store = SessionStore()
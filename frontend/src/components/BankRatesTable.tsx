@@ -39,11 +39,57 @@ export default function BankRatesTable({ onRateSelect }: BankRatesTableProps) {
   // Currently selected loan duration for display
   const [selectedDuration, setSelectedDuration] = useState<'10' | '15' | '20' | '25'>('20');
 
-  // Fetch bank rates when component mounts
+  // Fetch bank rates when component mounts, then apply the changes pushed by the server
   useEffect(() => {
     fetchBankRates();
+
+    const source = new EventSource('http://localhost:8000/bank-rates/stream');
+    source.addEventListener('delta', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      setRatesData(current => current && mergeDelta(current, data.changed, data.last_update));
+      setUpdating(false);
+    });
+    // History no longer covers what we missed: reload everything
+    source.addEventListener('reset', () => {
+      fetchBankRates();
+      setUpdating(false);
+    });
+    return () => source.close();
   }, []);
 
+  // Apply a delta (banks whose rates changed, with all their current rates) to the loaded data
+  const mergeDelta = (data: RatesResponse, changed: any[], lastUpdate: string): RatesResponse => {
+    const durations = ['10', '15', '20', '25'] as const;
+    const rates = data.rates.filter(bank => !changed.some(c => c.bank_name === bank.bank_name));
+    for (const row of changed) {
+      // A bank without any rate left has been removed
+      if (!durations.some(d => row[`rate_${d}_years`])) continue;
+      rates.push({
+        bank_name: row.bank_name,
+        rate_10_years: row.rate_10_years ?? 0,
+        rate_15_years: row.rate_15_years ?? 0,
+        rate_20_years: row.rate_20_years ?? 0,
+        rate_25_years: row.rate_25_years ?? 0,
+        last_updated: lastUpdate
+      });
+    }
+
+    const average = (d: typeof durations[number]) => rates.length
+      ? Math.round(rates.reduce((sum, bank) => sum + bank[`rate_${d}_years` as const], 0) / rates.length * 100) / 100
+      : 0;
+    return {
+      ...data,
+      rates,
+      average_rates: {
+        '10_years': average('10'),
+        '15_years': average('15'),
+        '20_years': average('20'),
+        '25_years': average('25')
+      },
+      last_update: lastUpdate
+    };
+  };
+
   // Function to fetch bank rates from the backend API
   const fetchBankRates = async () => {
     try {
@@ -61,11 +107,8 @@ export default function BankRatesTable({ onRateSelect }: BankRatesTableProps) {
     setUpdating(true);
     try {
       await axios.post('http://localhost:8000/bank-rates/update');
-      // Wait a bit for update to start, then refresh
-      setTimeout(() => {
-        fetchBankRates();
-        setUpdating(false);
-      }, 3000);
+      // The stream triggers the refresh; if no rate changed, stop the spinner after a while
+      setTimeout(() => setUpdating(false), 15000);
     } catch (error) {
       console.error('Error updating rates:', error);
       setUpdating(false);
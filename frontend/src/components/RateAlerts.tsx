@@ -35,53 +35,48 @@ export default function RateAlerts() {
     localStorage.setItem(ALERTS_STORAGE_KEY, JSON.stringify(alerts));
   }, [alerts]);
 
-  // Check alerts against current rates
+  // Check alerts against rates pushed by the server (full snapshot, then deltas)
   useEffect(() => {
-    const checkAlerts = async () => {
-      try {
-        const response = await fetch('/api/bank-rates');
-        const data = await response.json();
+    const checkAlerts = (rates: any[]) => {
+      setAlerts(current => current.map(alert => {
+        const bankRate = rates.find((r: any) => 
+          r.bank_name === alert.bankName
+        );
         
-        if (data.rates) {
-          const updatedAlerts = alerts.map(alert => {
-            const bankRate = data.rates.find((r: any) => 
-              r.bank_name === alert.bankName
-            );
-            
-            if (bankRate) {
-              const currentRate = bankRate[`rate_${alert.duration / 12}_years`];
-              
-              if (currentRate && currentRate <= alert.targetRate && !alert.notified) {
-                // Show notification
-                showNotification(alert, currentRate);
-                
-                return {
-                  ...alert,
-                  currentRate,
-                  notified: true
-                };
-              }
-              
-              return {
-                ...alert,
-                currentRate: currentRate || alert.currentRate
-              };
-            }
+        if (bankRate) {
+          const currentRate = bankRate[`rate_${alert.duration / 12}_years`];
+          
+          if (currentRate && currentRate <= alert.targetRate && !alert.notified) {
+            // Show notification
+            showNotification(alert, currentRate);
             
-            return alert;
-          });
+            return {
+              ...alert,
+              currentRate,
+              notified: true
+            };
+          }
           
-          setAlerts(updatedAlerts);
+          return {
+            ...alert,
+            currentRate: currentRate || alert.currentRate
+          };
         }
-      } catch (error) {
-        console.error('Error checking rate alerts:', error);
-      }
+        
+        return alert;
+      }));
     };
 
     if (alerts.length > 0) {
-      checkAlerts();
-      const interval = setInterval(checkAlerts, 60000); // Check every minute
-      return () => clearInterval(interval);
+      const source = new EventSource('http://localhost:8000/bank-rates/stream');
+      source.addEventListener('snapshot', (event) => {
+        checkAlerts(JSON.parse((event as MessageEvent).data).rates);
+      });
+      source.addEventListener('delta', (event) => {
+        checkAlerts(JSON.parse((event as MessageEvent).data).changed);
+      });
+      source.onerror = () => console.error('Rate stream interrupted, reconnecting...');
+      return () => source.close();
     }
   }, [alerts.length]);
 